@@ -0,0 +1,155 @@
+"""
+Parsing of Azure .NET QuickBuild console output, shared by the MCP server and its tests.
+"""
+
+import os
+from typing import Dict, List, NamedTuple, Optional
+
+try:
+    # google-re2 matches in linear time; the patterns below keep to the syntax it
+    # shares with the stdlib engine (inline flags, no lookaround or backreferences)
+    import re2 as _regex
+except ImportError:
+    import re as _regex
+
+# Common .NET error patterns fused into one alternation, compiled once at import.
+# Each alternative ends in its own message group so the match can be dispatched
+# on ``lastgroup``. Whitespace classes exclude newlines so the pattern can be run
+# over the whole build output without a match spilling into the next line.
+_ERROR_PATTERN = _regex.compile(
+    # Pattern: filepath(line[,column]): error CS####: message
+    r'(?P<file>[^(\s][^(\n]*)\((?P<line>\d+)(?:,\d+)?\):[^\S\n]*error[^\S\n]+CS\d+:[^\S\n]*(?P<cs_message>\S.*)'
+    # Pattern: error CS####: message
+    r'|error[^\S\n]+CS\d+:[^\S\n]*(?P<message>\S.*)'
+    # Pattern: filepath: error: message
+    r'|(?P<tool_file>[^:\s][^:\n]*):[^\S\n]*error:[^\S\n]*(?P<tool_message>\S.*)'
+    # Pattern: Build FAILED
+    r'|Build FAILED\.[^\S\n]*(?P<failed_message>\S.*)'
+)
+
+# Error-relevant lines: any line containing one of these indicators
+_ERROR_LINE_PATTERN = _regex.compile(
+    r'(?im)^.*(?:'
+    r'error[^\S\n]+CS\d+'                   # CS#### errors
+    r'|\berror\b'                           # General errors
+    r'|Build failed'                        # Build failure (case insensitive)
+    r'|\(\d+(?:,\d+)?\):[^\S\n]*error'      # File(line[,col]): error
+    r'|MSB\d+'                              # MSBuild errors
+    r'|fatal error'                         # Fatal errors
+    r').*$'
+)
+
+NO_ERROR_DETAILS = "No specific error details found in build output"
+
+# Console output longer than this many characters is cut down to its head and tail
+# before it is stored; the parsed errors already carry what matters from the middle
+DEFAULT_MAX_RAW_CHARS = 40000
+
+def _max_raw_chars() -> int:
+    """Read QUICKBUILD_MAX_RAW_CHARS, falling back to the default when it is not a whole number."""
+    try:
+        value = int(os.getenv("QUICKBUILD_MAX_RAW_CHARS", DEFAULT_MAX_RAW_CHARS))
+    except ValueError:
+        return DEFAULT_MAX_RAW_CHARS
+    return max(0, value)
+
+MAX_RAW_CHARS = _max_raw_chars()
+_RAW_HEAD_CHARS = min(4096, MAX_RAW_CHARS // 4)
+
+class QuickBuildError(NamedTuple):
+    # Field names match the keys of the error dicts returned to the client
+    file: str
+    line: Optional[int]
+    message: str
+    
+    def to_dict(self) -> Dict:
+        # A dict literal is cheaper than _asdict(), which zips the field names
+        return {"file": self.file, "line": self.line, "message": self.message}
+
+def _match_to_error(match) -> QuickBuildError:
+    """Build a QuickBuildError from a match of ``_ERROR_PATTERN``."""
+    # Groups start on a non-space character, so only trailing whitespace
+    # (including a stray \r) needs trimming
+    kind = match.lastgroup
+    if kind == "cs_message":
+        # File path, line number, and message
+        file_path = match.group("file").rstrip()
+        line_number = int(match.group("line"))
+    elif kind == "tool_message":
+        # File path and message
+        file_path = match.group("tool_file").rstrip()
+        line_number = None
+    else:
+        # Just the error message
+        file_path = ""
+        line_number = None
+    return QuickBuildError(file_path, line_number, match.group(kind).rstrip())
+
+def parse_build_errors(build_output: str) -> List[QuickBuildError]:
+    """
+    Parse the build output to extract compilation errors.
+    
+    This function looks for common .NET compilation error patterns:
+    - CS#### errors
+    - File paths with line numbers
+    - Error messages
+    """
+    errors = []
+    
+    # Every pattern needs one of these literals; a substring check is far cheaper
+    # than letting the regex engine try every position of a clean log
+    if 'error' in build_output or 'Build FAILED' in build_output:
+        seen = set()
+        for match in _ERROR_PATTERN.finditer(build_output):
+            error = _match_to_error(match)
+            # Multi-targeted projects repeat each error once per target framework
+            if error not in seen:
+                seen.add(error)
+                errors.append(error)
+    
+    # Additional parsing for MSBuild errors that might not match the patterns above
+    if 'Build FAILED' in build_output and not errors:
+        # If build failed but no specific errors were parsed, include general failure
+        errors.append(QuickBuildError("", None, "Build failed - check raw output for details"))
+    
+    return errors
+
+def extract_error_lines(build_output: str) -> str:
+    """
+    Extract only error-relevant lines from the build output to reduce token usage.
+    
+    This function filters the build output to include only:
+    - Lines containing .NET compilation errors (CS####)
+    - Lines containing the word "error" (case insensitive)
+    - Build failure summary lines
+    - Lines with file paths that have errors
+    """
+    if not build_output or build_output.isspace():
+        return ""
+    
+    # Every indicator needs one of these substrings, so a clean log never
+    # reaches the regex engine.
+    output_lower = build_output.lower()
+    if 'error' in output_lower or 'build failed' in output_lower or 'msb' in output_lower:
+        error_lines = [match.group(0) for match in _ERROR_LINE_PATTERN.finditer(build_output)]
+    else:
+        error_lines = []
+    
+    # If we found no error lines but the build output exists, include a summary
+    if not error_lines and ('failed' in output_lower or 'error' in output_lower):
+        # Look for build result summary
+        for line in build_output.splitlines():
+            line_lower = line.lower()
+            if any(keyword in line_lower for keyword in ['failed', 'succeeded', 'build']):
+                if any(keyword in line_lower for keyword in ['failed', 'error']):
+                    error_lines.append(line)
+    
+    return '\n'.join(error_lines) if error_lines else NO_ERROR_DETAILS
+
+def truncate_output(output: str) -> str:
+    """Keep the head and tail of output longer than MAX_RAW_CHARS, eliding the middle."""
+    if len(output) <= MAX_RAW_CHARS:
+        return output
+    tail_chars = MAX_RAW_CHARS - _RAW_HEAD_CHARS
+    elided = len(output) - MAX_RAW_CHARS
+    return output[:_RAW_HEAD_CHARS] + f"\n...[{elided} characters elided]...\n" + output[len(output) - tail_chars:]
@@ -1,13 +1,20 @@
 import asyncio
-import subprocess
+import atexit
+import codecs
+import io
+import locale
 import os
-import re
-import json
+import shutil
+import signal
+import stat
+import time
 import logging
-from datetime import datetime
-from typing import Dict, List, Optional
+import threading
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from fastmcp import FastMCP
 
+from quickbuild_parse import NO_ERROR_DETAILS, extract_error_lines, parse_build_errors, truncate_output
+
 mcp = FastMCP("Azure Net Quickbuild MCP Server")
 
 # Check if logging is enabled via environment variable
@@ -28,24 +35,99 @@ if LOGGING_ENABLED:
         ]
     )
     logger = logging.getLogger(__name__)
+    
+    # Detail logs stay open for the life of the process rather than being
+    # reopened for every entry
+    json_log_file = os.path.join(log_dir, "quickbuild_detailed.jsonl")
+    console_log_file = os.path.join(log_dir, "console_output.log")
+    _json_log_fd = os.open(json_log_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    _console_log_fd = os.open(console_log_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    atexit.register(os.close, _console_log_fd)
 else:
     # Create a no-op logger when logging is disabled
     logger = logging.getLogger(__name__)
     logger.addHandler(logging.NullHandler())
     logger.setLevel(logging.CRITICAL + 1)  # Disable all logging
 
-class QuickBuildError:
-    def __init__(self, file_path: str, line_number: Optional[int], error_message: str):
-        self.file_path = file_path
-        self.line_number = line_number
-        self.error_message = error_message
-    
-    def to_dict(self) -> Dict:
-        return {
-            "file": self.file_path,
-            "line": self.line_number,
-            "message": self.error_message
-        }
+# Resolved once so Popen can run quickbuild directly (including quickbuild.cmd
+# via PATHEXT on Windows) without going through a shell
+_QB_PATH = shutil.which("quickbuild") or "quickbuild"
+
+# Build output is decoded the same way text-mode pipes would decode it
+_OUTPUT_ENCODING = locale.getpreferredencoding(False)
+_READ_CHUNK_SIZE = 65536
+
+# How long a successful project directory check is reused before it is made again
+_DIR_CACHE_TTL_SECONDS = 30
+_DIR_CACHE_SIZE = 128
+# Project directories recently found to be directories -> when that expires, oldest
+# first. Failed checks are never kept, so a directory created or fixed after an
+# error is picked up by the very next call.
+_known_directories: Dict[str, float] = {}
+
+# JSONL entries are batched and written with a single os.write once the buffer
+# grows past _JSONL_FLUSH_BYTES or _JSONL_FLUSH_SECONDS have passed since the
+# last write. A timer writes out an entry that no later one pushes out, since MCP
+# hosts usually stop the server with a signal that skips the atexit flush
+_JSONL_FLUSH_BYTES = 64 * 1024
+_JSONL_FLUSH_SECONDS = 1.0
+_jsonl_buffer = bytearray()
+_jsonl_lock = threading.Lock()
+_jsonl_last_flush = time.monotonic()
+_jsonl_flush_timer: Optional[asyncio.TimerHandle] = None
+
+def _write_all(fd: int, *chunks) -> None:
+    """Write chunks to fd in order, with one writev call where the OS has it."""
+    if hasattr(os, "writev"):
+        written = os.writev(fd, chunks)
+        if written == sum(len(chunk) for chunk in chunks):
+            return
+        data = b"".join(chunks)[written:]
+    else:
+        data = b"".join(chunks)
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+def _flush_jsonl_buffer() -> None:
+    """Write out any buffered JSONL entries. Caller must hold _jsonl_lock."""
+    global _jsonl_last_flush
+    if _jsonl_buffer:
+        _write_all(_json_log_fd, _jsonl_buffer)
+    _jsonl_buffer.clear()
+    _jsonl_last_flush = time.monotonic()
+
+def _flush_jsonl_when_due() -> None:
+    """Timer callback writing out whatever is still buffered."""
+    global _jsonl_flush_timer
+    with _jsonl_lock:
+        _jsonl_flush_timer = None
+        _flush_jsonl_buffer()
+
+def _append_jsonl_entry(entry: str) -> None:
+    """Queue one JSONL entry, writing the batch out now or once it is due."""
+    global _jsonl_flush_timer
+    with _jsonl_lock:
+        _jsonl_buffer.extend(entry.encode("utf-8"))
+        _jsonl_buffer.extend(b"\n")
+        age = time.monotonic() - _jsonl_last_flush
+        if len(_jsonl_buffer) >= _JSONL_FLUSH_BYTES or age >= _JSONL_FLUSH_SECONDS:
+            _flush_jsonl_buffer()
+        elif _jsonl_flush_timer is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                _flush_jsonl_buffer()  # No loop to run a timer on
+            else:
+                _jsonl_flush_timer = loop.call_later(_JSONL_FLUSH_SECONDS - age, _flush_jsonl_when_due)
+
+def _close_jsonl_log() -> None:
+    with _jsonl_lock:
+        _flush_jsonl_buffer()
+    os.close(_json_log_fd)
+
+if LOGGING_ENABLED:
+    atexit.register(_close_jsonl_log)
 
 def _log_build_result(project_directory: str, result: Dict, raw_output: str, build_mode: str = "unknown") -> None:
     """
@@ -55,56 +137,154 @@ def _log_build_result(project_directory: str, result: Dict, raw_output: str, bui
     if not LOGGING_ENABLED:
         return  # Skip all logging if disabled
     
+    import json  # Only needed once logging is enabled
+    
+    # One timestamp for both detail logs, in the same local ISO 8601 form
+    # datetime.isoformat() produces
+    now = time.time()
+    timestamp = f"{time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(now))}.{int(now % 1 * 1e6):06d}"
+    
     log_entry = {
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": timestamp,
         "project_directory": project_directory,
         "build_mode": build_mode,
         "success": result["success"],
         "error_count": len(result["errors"]),
         "errors": result["errors"],
         "status": result["status"],
-        "full_console_output": raw_output  # Store complete output for troubleshooting
+        "full_console_output": truncate_output(raw_output)  # Head and tail of the output for troubleshooting
     }
     
-    logger.info(f"QuickBuild executed for {project_directory} (mode: {build_mode})")
-    logger.info(f"Result: {result['status']}")
-    if result["errors"]:
-        logger.info(f"Errors found ({len(result['errors'])}):")
-        for i, error in enumerate(result["errors"], 1):
-            logger.info(f"  {i}. {error['file']}:{error['line']} - {error['message']}")
-    
-    # Log a preview of the console output to the main log
-    if raw_output:
-        preview = raw_output[:300] + "..." if len(raw_output) > 300 else raw_output
-        logger.info(f"Console output preview: {preview}")
+    # Messages use deferred %-formatting so nothing is built for a level the
+    # logger would drop; the per-error loop is skipped outright in that case
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("QuickBuild executed for %s (mode: %s)", project_directory, build_mode)
+        logger.info("Result: %s", result["status"])
+        if result["errors"]:
+            logger.info("Errors found (%d):", len(result["errors"]))
+            for i, error in enumerate(result["errors"], 1):
+                logger.info("  %d. %s:%s - %s", i, error["file"], error["line"], error["message"])
+        
+        # Log a preview of the console output to the main log
+        if raw_output:
+            preview = raw_output[:300] + "..." if len(raw_output) > 300 else raw_output
+            logger.info("Console output preview: %s", preview)
     
     # Write detailed JSON log with full console output
-    json_log_file = os.path.join(os.path.dirname(log_file), "quickbuild_detailed.jsonl")
     try:
-        with open(json_log_file, "a", encoding="utf-8") as f:
-            f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
-        logger.info(f"Full console output logged to: {json_log_file}")
+        _append_jsonl_entry(json.dumps(log_entry, ensure_ascii=False))
+        logger.info("Build details (console output head and tail) queued for: %s", json_log_file)
     except Exception as e:
-        logger.error(f"Failed to write detailed log: {e}")
+        logger.error("Failed to write detailed log: %s", e)
     
-    # Also create a separate readable console output log
-    console_log_file = os.path.join(os.path.dirname(log_file), "console_output.log")
+    # Also write a separate readable console output log
     try:
-        with open(console_log_file, "a", encoding="utf-8") as f:
-            f.write(f"\n{'='*80}\n")
-            f.write(f"TIMESTAMP: {datetime.now().isoformat()}\n")
-            f.write(f"PROJECT: {project_directory}\n")
-            f.write(f"BUILD MODE: {build_mode}\n")
-            f.write(f"STATUS: {result['status']}\n")
-            f.write(f"{'='*80}\n")
-            f.write(raw_output)
-            f.write(f"\n{'='*80}\n\n")
-        logger.info(f"Readable console output logged to: {console_log_file}")
+        # The console output is encoded once and handed to the kernel between
+        # the header and footer, without being concatenated into one string
+        separator = '=' * 80
+        header = (
+            f"\n{separator}\n"
+            f"TIMESTAMP: {timestamp}\n"
+            f"PROJECT: {project_directory}\n"
+            f"BUILD MODE: {build_mode}\n"
+            f"STATUS: {result['status']}\n"
+            f"{separator}\n"
+        )
+        footer = f"\n{separator}\n\n"
+        _write_all(_console_log_fd, header.encode("utf-8"), raw_output.encode("utf-8"), footer.encode("utf-8"))
+        logger.info("Readable console output logged to: %s", console_log_file)
     except Exception as e:
-        logger.error(f"Failed to write console output log: {e}")
+        logger.error("Failed to write console output log: %s", e)
+
+def _directory_not_found(project_directory: str) -> Dict:
+    """Build the response for a project directory that does not exist."""
+    if LOGGING_ENABLED:
+        logger.warning(f"QuickBuild failed: Project directory not found - {project_directory}")
+    return {
+        "success": False,
+        "errors": [{"file": "", "line": None, "message": f"Project directory not found: {project_directory}"}],
+        "error_output": "",
+        "status": "❌ Project directory not found"
+    }
+
+def _stat_project_directory(project_directory: str) -> Optional[bool]:
+    """
+    Check a project directory with a single stat call.
+    
+    Returns None if the path does not exist, False if it is not a directory and
+    True if it is. A True result is reused for ``_DIR_CACHE_TTL_SECONDS``.
+    """
+    now = time.monotonic()
+    if _known_directories.get(project_directory, 0.0) > now:
+        return True
+    try:
+        is_directory = stat.S_ISDIR(os.stat(project_directory).st_mode)
+    except (OSError, ValueError):
+        return None  # Same cases os.path.exists treats as missing
+    if is_directory:
+        _known_directories.pop(project_directory, None)
+        _known_directories[project_directory] = now + _DIR_CACHE_TTL_SECONDS
+        if len(_known_directories) > _DIR_CACHE_SIZE:
+            del _known_directories[next(iter(_known_directories))]
+    return is_directory
+
+def _kill_build(process: asyncio.subprocess.Process) -> None:
+    """Kill a build, including its child processes on POSIX."""
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass  # Build exited just as the timeout fired
+
+async def _stream_output_lines(stdout: asyncio.StreamReader) -> AsyncIterator[str]:
+    """Yield the build output as decoded lines, each ending in a newline except possibly the last."""
+    decoder = io.IncrementalNewlineDecoder(
+        codecs.getincrementaldecoder(_OUTPUT_ENCODING)(errors="replace"), translate=True
+    )
+    pending = ""
+    while chunk := await stdout.read(_READ_CHUNK_SIZE):
+        pending += decoder.decode(chunk)
+        start = 0
+        end = pending.find("\n") + 1
+        while end:
+            yield pending[start:end]
+            start = end
+            end = pending.find("\n", start) + 1
+        pending = pending[start:]
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+async def _collect_build_output(
+    process: asyncio.subprocess.Process, keep_full_output: bool
+) -> Tuple[int, List[str], Optional[List[str]], bool]:
+    """
+    Read the build output as it is produced and wait for the build to exit.
+    
+    Only lines containing "error", "failed" or "msb" (in any case) can be picked
+    up by the error parsers, so everything else is dropped as it streams by; the
+    full log is kept only if ``keep_full_output`` is set. Returns the exit code,
+    the relevant lines, the full log (or None) and whether any non-blank output
+    was seen.
+    """
+    relevant_lines = []
+    full_output = [] if keep_full_output else None
+    has_output = False
+    async for line in _stream_output_lines(process.stdout):
+        if full_output is not None:
+            full_output.append(line)
+        line_lower = line.lower()
+        if 'error' in line_lower or 'failed' in line_lower or 'msb' in line_lower:
+            relevant_lines.append(line)
+        elif not has_output and not line.isspace():
+            has_output = True
+    return_code = await process.wait()
+    return return_code, relevant_lines, full_output, has_output
 
 @mcp.tool
-def azure_net_quickbuild(
+async def azure_net_quickbuild(
     project_directory: str,
     timeout_minutes: int = 10,
     build_mode: str = "debug"
@@ -125,19 +305,14 @@ def azure_net_quickbuild(
         - status: Human-readable status message
     """
     
+    is_directory = _stat_project_directory(project_directory)
+    
     # Validate directory exists
-    if not os.path.exists(project_directory):
-        if LOGGING_ENABLED:
-            logger.warning(f"QuickBuild failed: Project directory not found - {project_directory}")
-        return {
-            "success": False,
-            "errors": [{"file": "", "line": None, "message": f"Project directory not found: {project_directory}"}],
-            "error_output": "",
-            "status": "❌ Project directory not found"
-        }
+    if is_directory is None:
+        return _directory_not_found(project_directory)
     
     # Validate directory is accessible
-    if not os.path.isdir(project_directory):
+    if not is_directory:
         if LOGGING_ENABLED:
             logger.warning(f"QuickBuild failed: Invalid project directory - {project_directory}")
         return {
@@ -150,11 +325,11 @@ def azure_net_quickbuild(
     try:
         # Determine quickbuild command based on build_mode
         if build_mode == "debug":
-            command = ["quickbuild", "-debug"]
+            command = [_QB_PATH, "-debug"]
         elif build_mode == "notest":
-            command = ["quickbuild", "-notest", "-debug"]
+            command = [_QB_PATH, "-notest", "-debug"]
         elif build_mode == "standard":
-            command = ["quickbuild"]
+            command = [_QB_PATH]
         else:
             if LOGGING_ENABLED:
                 logger.error(f"Invalid build_mode '{build_mode}' for {project_directory}")
@@ -168,22 +343,25 @@ def azure_net_quickbuild(
         if LOGGING_ENABLED:
             logger.info(f"Running command: {' '.join(command)} in {project_directory}")
         
-        # Run quickbuild command
-        process = subprocess.Popen(
-            command,
+        # Run quickbuild command without blocking the event loop, so concurrent
+        # builds run in parallel
+        process = await asyncio.create_subprocess_exec(
+            *command,
             cwd=project_directory,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            shell=True
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            # Own process group on POSIX so a timeout can kill the whole build tree
+            start_new_session=os.name == "posix"
         )
         
-        # Wait for completion with timeout
         try:
-            output, _ = process.communicate(timeout=timeout_minutes * 60)
-            return_code = process.returncode
-        except subprocess.TimeoutExpired:
-            process.kill()
+            return_code, relevant_lines, full_output, has_output = await asyncio.wait_for(
+                _collect_build_output(process, keep_full_output=LOGGING_ENABLED),
+                timeout_minutes * 60
+            )
+        except asyncio.TimeoutError:
+            _kill_build(process)
+            await process.wait()
             if LOGGING_ENABLED:
                 logger.warning(f"QuickBuild timed out after {timeout_minutes} minutes for {project_directory}")
             return {
@@ -193,24 +371,34 @@ def azure_net_quickbuild(
                 "status": f"❌ Build timed out after {timeout_minutes} minutes"
             }
         
+        relevant_output = ''.join(relevant_lines)
+        output = ''.join(full_output) if full_output is not None else relevant_output
+        
         # Parse the output for errors
-        errors = _parse_build_errors(output)
+        errors = parse_build_errors(relevant_output)
         
         # Extract only error-relevant lines from the output
-        error_output = _extract_error_lines(output)
+        if relevant_output:
+            error_output = extract_error_lines(relevant_output)
+        else:
+            error_output = NO_ERROR_DETAILS if has_output else ""
+        
+        # Materialize the error dicts once; the response and the build log
+        # (which reads result["errors"]) share this list
+        error_dicts = [error.to_dict() for error in errors]
         
         # Determine success based on return code and parsed errors
-        success = return_code == 0 and len(errors) == 0
+        success = return_code == 0 and not error_dicts
         
         if success:
             status = "✅ Build completed successfully - No errors found"
         else:
-            error_count = len(errors)
+            error_count = len(error_dicts)
             status = f"❌ Build failed with {error_count} error(s)"
         
         result = {
             "success": success,
-            "errors": [error.to_dict() for error in errors],
+            "errors": error_dicts,
             "error_output": error_output,
             "status": status
         }
@@ -221,6 +409,11 @@ def azure_net_quickbuild(
         return result
         
     except FileNotFoundError:
+        # The directory may have been removed since its cached check; that is also reported
+        # as FileNotFoundError (from cwd=), and is not a missing quickbuild command
+        _known_directories.pop(project_directory, None)
+        if not os.path.isdir(project_directory):
+            return _directory_not_found(project_directory)
         if LOGGING_ENABLED:
             logger.error(f"QuickBuild command not found for project {project_directory}")
         return {
@@ -239,123 +432,5 @@ def azure_net_quickbuild(
             "status": f"❌ Unexpected error: {str(e)}"
         }
 
-def _parse_build_errors(build_output: str) -> List[QuickBuildError]:
-    """
-    Parse the build output to extract compilation errors.
-    
-    This function looks for common .NET compilation error patterns:
-    - CS#### errors
-    - File paths with line numbers
-    - Error messages
-    """
-    errors = []
-    
-    # Common .NET error patterns
-    patterns = [
-        # Pattern: filepath(line,column): error CS####: message
-        r'([^(]+)\((\d+),\d+\):\s*error\s+CS\d+:\s*(.+)',
-        # Pattern: filepath(line): error CS####: message
-        r'([^(]+)\((\d+)\):\s*error\s+CS\d+:\s*(.+)',
-        # Pattern: error CS####: message
-        r'error\s+CS\d+:\s*(.+)',
-        # Pattern: filepath: error: message
-        r'([^:]+):\s*error:\s*(.+)',
-        # Pattern: Build FAILED
-        r'Build FAILED\.\s*(.+)'
-    ]
-    
-    lines = build_output.split('\n')
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-            
-        for pattern in patterns:
-            match = re.search(pattern, line)
-            if match:
-                if len(match.groups()) >= 3:
-                    # File path, line number, and message
-                    file_path = match.group(1).strip()
-                    try:
-                        line_number = int(match.group(2))
-                    except (ValueError, IndexError):
-                        line_number = None
-                    error_message = match.group(3).strip()
-                elif len(match.groups()) == 2:
-                    # File path and message, or just message with context
-                    if ':' in match.group(1):
-                        file_path = match.group(1).strip()
-                        error_message = match.group(2).strip()
-                        line_number = None
-                    else:
-                        file_path = ""
-                        error_message = match.group(1).strip()
-                        line_number = None
-                else:
-                    # Just the error message
-                    file_path = ""
-                    line_number = None
-                    error_message = match.group(1).strip()
-                
-                errors.append(QuickBuildError(file_path, line_number, error_message))
-                break
-    
-    # Additional parsing for MSBuild errors that might not match the patterns above
-    if 'Build FAILED' in build_output and not errors:
-        # If build failed but no specific errors were parsed, include general failure
-        errors.append(QuickBuildError("", None, "Build failed - check raw output for details"))
-    
-    return errors
-
-def _extract_error_lines(build_output: str) -> str:
-    """
-    Extract only error-relevant lines from the build output to reduce token usage.
-    
-    This function filters the build output to include only:
-    - Lines containing .NET compilation errors (CS####)
-    - Lines containing the word "error" (case insensitive)
-    - Build failure summary lines
-    - Lines with file paths that have errors
-    """
-    if not build_output.strip():
-        return ""
-    
-    error_lines = []
-    lines = build_output.split('\n')
-    
-    # Patterns that indicate error-relevant lines
-    error_indicators = [
-        r'error\s+CS\d+',  # CS#### errors
-        r'\berror\b',       # General errors (case insensitive via flags)
-        r'Build FAILED',    # Build failure
-        r'Build failed',    # Build failure (alternate)
-        r'\(\d+,\d+\):\s*error',  # File(line,col): error
-        r'\(\d+\):\s*error',      # File(line): error
-        r'MSB\d+',         # MSBuild errors
-        r'fatal error',    # Fatal errors
-    ]
-    
-    for line in lines:
-        line_stripped = line.strip()
-        if not line_stripped:
-            continue
-            
-        # Check if line matches any error pattern
-        for pattern in error_indicators:
-            if re.search(pattern, line, re.IGNORECASE):
-                error_lines.append(line)
-                break
-    
-    # If we found no error lines but the build output exists, include a summary
-    if not error_lines and build_output.strip():
-        # Look for build result summary
-        for line in lines:
-            if any(keyword in line.lower() for keyword in ['failed', 'succeeded', 'build']):
-                if any(keyword in line.lower() for keyword in ['failed', 'error']):
-                    error_lines.append(line)
-    
-    return '\n'.join(error_lines) if error_lines else "No specific error details found in build output"
-
 if __name__ == "__main__":
     mcp.run()
\ No newline at end of file
@@ -9,22 +9,11 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Import the raw function before it gets decorated
+import shutil
 import subprocess
-import re
-from typing import Dict, List, Optional
+from typing import Dict
 
-class QuickBuildError:
-    def __init__(self, file_path: str, line_number: Optional[int], error_message: str):
-        self.file_path = file_path
-        self.line_number = line_number
-        self.error_message = error_message
-    
-    def to_dict(self) -> Dict:
-        return {
-            "file": self.file_path,
-            "line": self.line_number,
-            "message": self.error_message
-        }
+from quickbuild_parse import MAX_RAW_CHARS, parse_build_errors, truncate_output
 
 def azure_net_quickbuild_raw(project_directory: str, timeout_minutes: int = 10) -> Dict:
     """Raw version of the function for testing purposes."""
@@ -50,12 +39,11 @@ def azure_net_quickbuild_raw(project_directory: str, timeout_minutes: int = 10)
     try:
         # Run quickbuild -debug command
         process = subprocess.Popen(
-            ["quickbuild", "-debug"],
+            [shutil.which("quickbuild") or "quickbuild", "-debug"],
             cwd=project_directory,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
-            text=True,
-            shell=True
+            text=True
         )
         
         # Wait for completion with timeout
@@ -72,7 +60,7 @@ def azure_net_quickbuild_raw(project_directory: str, timeout_minutes: int = 10)
             }
         
         # Parse the output for errors
-        errors = _parse_build_errors(output)
+        errors = parse_build_errors(output)
         
         # Determine success based on return code and parsed errors
         success = return_code == 0 and len(errors) == 0
@@ -86,7 +74,7 @@ def azure_net_quickbuild_raw(project_directory: str, timeout_minutes: int = 10)
         return {
             "success": success,
             "errors": [error.to_dict() for error in errors],
-            "raw_output": output,
+            "raw_output": truncate_output(output),
             "status": status
         }
         
@@ -105,68 +93,6 @@ def azure_net_quickbuild_raw(project_directory: str, timeout_minutes: int = 10)
             "status": f"❌ Unexpected error: {str(e)}"
         }
 
-def _parse_build_errors(build_output: str) -> List[QuickBuildError]:
-    """Parse the build output to extract compilation errors."""
-    errors = []
-    
-    # Common .NET error patterns
-    patterns = [
-        # Pattern: filepath(line,column): error CS####: message
-        r'([^(]+)\((\d+),\d+\):\s*error\s+CS\d+:\s*(.+)',
-        # Pattern: filepath(line): error CS####: message
-        r'([^(]+)\((\d+)\):\s*error\s+CS\d+:\s*(.+)',
-        # Pattern: error CS####: message
-        r'error\s+CS\d+:\s*(.+)',
-        # Pattern: filepath: error: message
-        r'([^:]+):\s*error:\s*(.+)',
-        # Pattern: Build FAILED
-        r'Build FAILED\.\s*(.+)'
-    ]
-    
-    lines = build_output.split('\n')
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-            
-        for pattern in patterns:
-            match = re.search(pattern, line)
-            if match:
-                if len(match.groups()) >= 3:
-                    # File path, line number, and message
-                    file_path = match.group(1).strip()
-                    try:
-                        line_number = int(match.group(2))
-                    except (ValueError, IndexError):
-                        line_number = None
-                    error_message = match.group(3).strip()
-                elif len(match.groups()) == 2:
-                    # File path and message, or just message with context
-                    if ':' in match.group(1):
-                        file_path = match.group(1).strip()
-                        error_message = match.group(2).strip()
-                        line_number = None
-                    else:
-                        file_path = ""
-                        error_message = match.group(1).strip()
-                        line_number = None
-                else:
-                    # Just the error message
-                    file_path = ""
-                    line_number = None
-                    error_message = match.group(1).strip()
-                
-                errors.append(QuickBuildError(file_path, line_number, error_message))
-                break
-    
-    # Additional parsing for MSBuild errors that might not match the patterns above
-    if 'Build FAILED' in build_output and not errors:
-        # If build failed but no specific errors were parsed, include general failure
-        errors.append(QuickBuildError("", None, "Build failed - check raw output for details"))
-    
-    return errors
-
 def test_azure_net_quickbuild():
     """Test the azure_net_quickbuild function with different scenarios."""
     
@@ -207,13 +133,29 @@ AnotherFile.cs(23): error CS1002: ; expected
       2 Error(s)
 """
     
-    errors = _parse_build_errors(sample_output)
+    errors = parse_build_errors(sample_output)
     print(f"Parsed {len(errors)} errors:")
     for i, error in enumerate(errors, 1):
-        print(f"  {i}. File: {error.file_path}, Line: {error.line_number}, Message: {error.error_message}")
+        print(f"  {i}. File: {error.file}, Line: {error.line}, Message: {error.message}")
     
     assert len(errors) >= 2, "Should parse at least 2 errors from sample output"
     
+    # Test 4: Duplicate errors across target frameworks
+    print("\n📋 Test 4: Duplicate error collapsing")
+    multi_target_output = sample_output + "MyProject.cs(15,5): error CS0103: The name 'invalidVariable' does not exist in the current context\n"
+    deduped = parse_build_errors(multi_target_output)
+    print(f"Parsed {len(deduped)} unique errors")
+    assert len(deduped) == len(errors), "Should collapse errors repeated for another target"
+    
+    # Test 5: Raw output truncation
+    print("\n📋 Test 5: Raw output truncation")
+    long_output = "head\n" + "x" * (MAX_RAW_CHARS * 2) + "\ntail"
+    truncated = truncate_output(long_output)
+    print(f"Original: {len(long_output)} chars, truncated: {len(truncated)} chars")
+    assert truncated.startswith("head") and truncated.endswith("tail"), "Should keep head and tail"
+    assert len(truncated) < len(long_output), "Should elide the middle of long output"
+    assert truncate_output(sample_output) == sample_output, "Should leave short output unchanged"
+    
     print("\n✅ All tests passed!")
 
 if __name__ == "__main__":
@@ -3,204 +3,686 @@ import re
 import mmap
 import hashlib
 import json
+import pickle
+import tempfile
 import time
 from pathlib import Path
-from typing import Dict, List, Optional, Set, Tuple
-from collections import defaultdict
+from typing import AsyncIterator, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 import fnmatch
+import heapq
+import math
+from bisect import bisect_left
+from contextlib import asynccontextmanager
 from fastmcp import FastMCP
 
-mcp = FastMCP("Azure Wiki MCP Server")
+@asynccontextmanager
+async def _lifespan(server: FastMCP) -> AsyncIterator[None]:
+    """Write any index changes not yet saved when the server shuts down."""
+    try:
+        yield
+    finally:
+        search_engine.save_index()
+
+mcp = FastMCP("Azure Wiki MCP Server", lifespan=_lifespan)
+
+# Bloom filter hashing: xxh3 when the optional xxhash package is installed, else blake2b.
+# Both give a stable 128-bit value, so saved bloom bits stay valid across restarts.
+try:
+    import xxhash
+    _bloom_hash = xxhash.xxh3_128_intdigest
+    BLOOM_HASH_NAME = "xxh3_128"
+except ImportError:
+    def _bloom_hash(data: bytes) -> int:
+        return int.from_bytes(hashlib.blake2b(data, digest_size=16).digest(), 'little')
+    BLOOM_HASH_NAME = "blake2b"
+
+# File types indexed by default
+DEFAULT_EXTENSIONS = ('.md', '.txt', '.rst', '.html', '.xml')
+
+# On-disk copy of the index for warm restarts, kept beside the docs folder (not inside it,
+# so writing it never changes the directory mtimes the file listing cache checks)
+INDEX_FILE_NAME = ".wiki_index.pickle"
+INDEX_FORMAT_VERSION = 4
+INDEX_SAVE_CHANGES = 100  # File re-indexes and removals between saves made during searches
+
+# Characters of section text returned with each search result
+PREVIEW_CHARS = 500
+
+# Characters of decoded file text kept for phrase checks, least recently used files dropped first
+FILE_CACHE_CHARS = 16_000_000
+
+# BM25 ranking parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+TITLE_BOOST = 2.0  # Added per query term found in a section title, as a multiple of its idf
+PHRASE_BOOST = 1.0  # Added for an exact phrase match, as a multiple of the query's summed idf
+
+# Query words whose containing terms are kept for phrase candidate lookups
+SUBSTRING_CACHE_SIZE = 256
+
+# Bloom filter capacity before the first words are indexed; it is rebuilt at twice the
+# vocabulary size whenever the vocabulary outgrows it
+BLOOM_MIN_ITEMS = 1024
+
+# Searchable words: runs of two or more word characters (matched against lowercased text)
+_WORD_RE = re.compile(r'\b\w{2,}\b')
+
+# Markdown header lines: '#' after optional leading whitespace, up to the end of the line
+_HEADER_RE = re.compile(r'^[^\S\n]*#.*$', re.MULTILINE)
+
+def optimal_bloom_params(expected_items: int, fp_rate: float = 0.01) -> Tuple[int, int]:
+    """Return (bit count, hash count) for a Bloom filter of the given capacity and false-positive rate."""
+    expected_items = max(1, expected_items)
+    m = math.ceil(-expected_items * math.log(fp_rate) / (math.log(2) ** 2))
+    m = (m + 7) // 8 * 8  # Round up to a whole number of bytes
+    k = max(1, round(m / expected_items * math.log(2)))
+    return m, k
+
+class BloomFilter:
+    """
+    Bit-array Bloom filter for quick negative word lookups.
+    Derives k bit positions from one 128-bit hash via double hashing.
+    The false-positive rate only holds for up to capacity distinct words.
+    """
+    
+    def __init__(self, expected_items: int = BLOOM_MIN_ITEMS, fp_rate: float = 0.01):
+        self.capacity = expected_items
+        self.num_bits, self.num_hashes = optimal_bloom_params(expected_items, fp_rate)
+        self.bits = bytearray(self.num_bits // 8)
+    
+    def _indexes(self, word: str):
+        h = _bloom_hash(word.encode())
+        h1 = h & 0xFFFFFFFFFFFFFFFF
+        h2 = (h >> 64) | 1
+        m = self.num_bits
+        return [(h1 + i * h2) % m for i in range(self.num_hashes)]
+    
+    def add(self, word: str) -> None:
+        bits = self.bits
+        for idx in self._indexes(word):
+            bits[idx >> 3] |= 1 << (idx & 7)
+    
+    def __contains__(self, word: str) -> bool:
+        bits = self.bits
+        return all(bits[idx >> 3] & (1 << (idx & 7)) for idx in self._indexes(word))
+
+class _IndexUnpickler(pickle.Unpickler):
+    """Unpickler that refuses to load any class, since the saved index only holds builtin types."""
+    
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"unexpected global in wiki index: {module}.{name}")
 
 class WikiSearchEngine:
     """
     High-performance wiki search engine designed for large documentation sets.
-    Uses lazy indexing, memory-mapped files, and smart caching for speed.
+    Uses an inverted index, memory-mapped files, and smart caching for speed.
     """
     
     def __init__(self, docs_path: str):
         self.docs_path = Path(docs_path)
-        self.file_cache = {}  # LRU cache for file contents
-        self.index_cache = {}  # Cached file indexes
+        self.file_cache = OrderedDict()  # LRU cache for file contents: Path -> (file_key, text)
+        self._file_cache_chars = 0  # Total length of the texts in file_cache
+        self.postings = defaultdict(list)  # Term id -> [(file_id, section_id, term frequency)]
+        self.sections = []  # Section id -> indexed section dict (None once its file is re-indexed or removed)
+        self._free_section_ids = []  # Min-heap of the ids of None entries in sections, reused before appending
+        self.indexed_files = {}  # Path -> (file_id, file_key, section ids, term ids)
+        self._file_ids = {}  # Path -> file id, kept stable across re-indexing
+        self._section_count = 0  # Live sections, for BM25 idf
+        self._total_length = 0  # Sum of live section lengths in words, for BM25 average length
+        self._idf_cache = {}  # Term id -> idf, reset whenever the index changes
+        self._executor = None  # Thread pool for reading and parsing files, created on first use
         self.file_stats = {}  # File modification times for cache invalidation
-        self.bloom_filter = set()  # Simple bloom filter for quick negative lookups
-        self.max_cache_size = 50  # Maximum files to keep in memory
+        self.bloom = BloomFilter()  # Bit-array bloom filter for quick negative lookups
+        self.bloom_ready = False  # Set once every file has been indexed into the bloom filter
+        self.vocab = {}  # Indexed word -> integer term id, also used for search suggestions
+        self._vocab_sorted = []  # Sorted vocabulary words for prefix lookups
+        self._vocab_dirty = False  # Rebuild _vocab_sorted on next suggestion call
+        self._substring_terms = {}  # Query word -> ids of terms containing it, oldest first
+        self._file_list_cache = None  # (extensions, directory mtimes, files) from the last walk
+        self.index_path = self.docs_path.parent / f".{self.docs_path.name}{INDEX_FILE_NAME}"
+        self._unsaved_changes = 0  # Files re-indexed or removed since the index was last saved
+        self._load_index()
         
     def _get_all_files(self, extensions: List[str] = None) -> List[Path]:
         """Get all documentation files, optionally filtered by extension."""
         if extensions is None:
-            extensions = ['.md', '.txt', '.rst', '.html', '.xml']
+            extensions = DEFAULT_EXTENSIONS
+        extensions = tuple(extensions)
+        
+        # Reuse the last listing while no directory in the tree has changed
+        cached = self._file_list_cache
+        if cached is not None and cached[0] == extensions and self._dirs_unchanged(cached[1]):
+            return cached[2]
         
-        files = []
         if not self.docs_path.exists():
-            return files
-            
-        for ext in extensions:
-            pattern = f"**/*{ext}"
-            files.extend(self.docs_path.glob(pattern))
+            return []
         
-        return sorted(files)
+        dir_mtimes = {}
+        files = []
+        pending = [str(self.docs_path)]
+        while pending:
+            directory = pending.pop()
+            try:
+                dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                pending.append(entry.path)
+                            elif entry.name.endswith(extensions) and entry.is_file():
+                                files.append(Path(entry.path))
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        
+        files.sort()
+        self._file_list_cache = (extensions, dir_mtimes, files)
+        return files
+    
+    @staticmethod
+    def _dirs_unchanged(dir_mtimes: Dict[str, int]) -> bool:
+        """Check that every directory from a previous walk still has the same mtime."""
+        for directory, mtime in dir_mtimes.items():
+            try:
+                if os.stat(directory).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
     
-    def _get_file_hash(self, file_path: Path) -> str:
-        """Get a hash of file path and modification time for cache keys."""
+    def _get_file_key(self, file_path: Path) -> Optional[Tuple[int, int]]:
+        """Get the (mtime_ns, size) fingerprint used to detect changed files, or None if it cannot be read."""
         try:
-            stat = file_path.stat()
-            content = f"{file_path}:{stat.st_mtime}:{stat.st_size}"
-            return hashlib.md5(content.encode()).hexdigest()
-        except (OSError, IOError):
-            return hashlib.md5(str(file_path).encode()).hexdigest()
+            stat = os.stat(file_path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except (OSError, ValueError):
+            return None
     
     def _read_file_chunked(self, file_path: Path, chunk_size: int = 8192) -> str:
-        """Read file in chunks to handle large files efficiently."""
+        """Read a file through a read-only memory map, decoding straight from the mapped pages."""
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                return f.read()
-        except (OSError, IOError, UnicodeDecodeError):
-            try:
-                # Try with different encoding
-                with open(file_path, 'r', encoding='latin-1', errors='ignore') as f:
-                    return f.read()
-            except:
-                return ""
+            with open(file_path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return ""
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    # str() decodes from the buffer itself, without first copying it into bytes
+                    content = str(mm, 'utf-8', errors='ignore')
+        except (OSError, ValueError):
+            return ""
+        
+        # Match text-mode reads, which translate all newline styles to '\n'
+        if '\r' in content:
+            content = content.replace('\r\n', '\n').replace('\r', '\n')
+        return content
     
     def _extract_sections(self, content: str, file_path: Path) -> List[Dict]:
-        """Extract sections with headers for better search results."""
+        """
+        Extract sections with headers for better search results.
+        Header lines are located with _HEADER_RE and section bodies are sliced out of content
+        between them, so the file is never split into a list of lines.
+        """
         sections = []
-        lines = content.split('\n')
-        current_section = {"title": str(file_path.name), "content": [], "level": 0}
+        relative_path = str(file_path.relative_to(self.docs_path))
+        current_section = {"title": str(file_path.name), "level": 0, "file": relative_path}
+        body_start = 0
+        line_num = 1
+        last_pos = 0
         
-        for line_num, line in enumerate(lines, 1):
-            # Detect markdown headers
-            if line.strip().startswith('#'):
-                # Save previous section
-                if current_section["content"]:
-                    current_section["content"] = '\n'.join(current_section["content"])
-                    sections.append(current_section.copy())
-                
-                # Start new section
-                level = len(line) - len(line.lstrip('#'))
-                title = line.strip('#').strip()
-                current_section = {
-                    "title": title,
-                    "content": [],
-                    "level": level,
-                    "line": line_num,
-                    "file": str(file_path.relative_to(self.docs_path))
-                }
-            else:
-                current_section["content"].append(line)
+        for match in _HEADER_RE.finditer(content):
+            header_start = match.start()
+            # Save previous section (if any lines lie between it and this header)
+            if body_start < header_start:
+                sections.append(self._finish_section(current_section, content, body_start, header_start - 1))
+            
+            # Start new section
+            line = match.group()
+            line_num += content.count('\n', last_pos, header_start)
+            last_pos = header_start
+            current_section = {
+                "title": line.strip('#').strip(),
+                "level": len(line) - len(line.lstrip('#')),
+                "line": line_num,
+                "file": relative_path
+            }
+            body_start = match.end() + 1
         
         # Add final section
-        if current_section["content"]:
-            current_section["content"] = '\n'.join(current_section["content"])
-            sections.append(current_section)
+        if body_start <= len(content):
+            sections.append(self._finish_section(current_section, content, body_start, len(content)))
         
         return sections
     
-    def _build_word_index(self, content: str) -> Set[str]:
-        """Build a set of searchable words from content."""
+    def _finish_section(self, section: Dict, content: str, start: int, end: int) -> Dict:
+        """
+        Attach the preview, word counts and lowercased title of the section whose body is content[start:end].
+        The body itself is not kept; phrase checks re-read it from the file using the recorded span.
+        """
+        body = content[start:end]
+        section["preview"] = body[:PREVIEW_CHARS] + "..." if len(body) > PREVIEW_CHARS else body
+        section["span"] = (start, end)
         # Simple word extraction - could be enhanced with stemming/lemmatization
-        words = set()
-        # Extract words (alphanumeric + common punctuation)
-        word_pattern = re.compile(r'\b\w{2,}\b', re.IGNORECASE)
-        for word in word_pattern.findall(content.lower()):
-            words.add(word)
-            # Add to bloom filter for quick negative lookups
-            self.bloom_filter.add(word)
-        return words
+        section["word_counts"] = Counter(_WORD_RE.findall(body.lower()))
+        section["title_lower"] = section["title"].lower()
+        section["title_words"] = set(_WORD_RE.findall(section["title_lower"]))
+        return section
+    
+    def _build_word_index(self, word_counts: Dict[str, int]) -> Dict[int, int]:
+        """Translate a section's word counts into term id counts, assigning ids to new words."""
+        self._add_vocabulary(word_counts)
+        vocab = self.vocab
+        return {vocab[word]: count for word, count in word_counts.items()}
+    
+    def _add_vocabulary(self, words: Iterable[str]) -> None:
+        """Assign term ids to new words and record them in the bloom filter."""
+        vocab = self.vocab
+        new_words = [word for word in words if word not in vocab]
+        if new_words:
+            for word in new_words:
+                vocab[word] = len(vocab)
+            if len(vocab) > self.bloom.capacity:
+                self._rebuild_bloom()
+            else:
+                # Add to bloom filter for quick negative lookups
+                for word in new_words:
+                    self.bloom.add(word)
+            self._vocab_dirty = True
+            self._update_substring_terms(new_words)
+    
+    def _rebuild_bloom(self) -> None:
+        """Replace the bloom filter with one sized for twice the current vocabulary."""
+        bloom = BloomFilter(max(BLOOM_MIN_ITEMS, 2 * len(self.vocab)))
+        for word in self.vocab:
+            bloom.add(word)
+        self.bloom = bloom
+    
+    def _term_ids(self, query_words: Set[str]) -> FrozenSet[int]:
+        """Translate query words to term ids, dropping words that have not been indexed."""
+        vocab = self.vocab
+        return frozenset([vocab[word] for word in query_words if word in vocab])
+    
+    def _terms_containing(self, word: str) -> Set[int]:
+        """Get the ids of all indexed terms that contain word as a substring (do not modify the result)."""
+        cache = self._substring_terms
+        term_ids = cache.get(word)
+        if term_ids is None:
+            # One scan of the vocabulary; later additions are folded in by _update_substring_terms
+            term_ids = {term_id for term, term_id in self.vocab.items() if word in term}
+            if len(cache) >= SUBSTRING_CACHE_SIZE:
+                del cache[next(iter(cache))]
+            cache[word] = term_ids
+        return term_ids
+    
+    def _update_substring_terms(self, new_words: List[str]) -> None:
+        """Add newly indexed words to the cached substring lookups they match."""
+        cache = self._substring_terms
+        if not cache:
+            return
+        if len(new_words) * len(cache) > len(self.vocab):
+            # Checking every pair would cost more than rescanning the vocabulary on demand
+            cache.clear()
+            return
+        vocab = self.vocab
+        for word, term_ids in cache.items():
+            term_ids.update(vocab[new_word] for new_word in new_words if word in new_word)
+    
+    def suggest_words(self, prefix: str, max_suggestions: int = 10) -> List[str]:
+        """Return indexed words that extend prefix, shortest first."""
+        if self._vocab_dirty:
+            self._vocab_sorted = sorted(self.vocab)
+            self._vocab_dirty = False
+        vocab = self._vocab_sorted
+        lo = bisect_left(vocab, prefix)
+        hi = bisect_left(vocab, prefix + '\U0010ffff', lo)
+        return sorted((word for word in vocab[lo:hi] if len(word) > len(prefix)), key=len)[:max_suggestions]
     
     def search_files(self, query: str, max_results: int = 10, file_pattern: str = "*") -> List[Dict]:
         """
         Search for query across all wiki files.
         Returns list of matching sections with relevance scoring.
         """
-        query_words = set(re.findall(r'\b\w{2,}\b', query.lower()))
+        files = self._get_search_files(file_pattern)
+        self._sync_index(files, complete=file_pattern == "*")
+        return self._search_index(query, max_results, self._file_ranks(files))
+    
+    def batch_search(self, queries: List[str], max_results: int = 10, file_pattern: str = "*") -> Dict[str, List[Dict]]:
+        """
+        Search for several queries, bringing the index up to date only once.
+        Returns a dict mapping each query to the same results search_files would give.
+        """
+        files = self._get_search_files(file_pattern)
+        self._sync_index(files, complete=file_pattern == "*")
+        file_ranks = self._file_ranks(files)
+        return {query: self._search_index(query, max_results, file_ranks) for query in queries}
+    
+    def _search_index(self, query: str, max_results: int, file_ranks: Dict[int, int]) -> List[Dict]:
+        """Score the sections whose postings contain a query term, limited to the ranked files."""
+        query_lower = query.lower()
+        query_words = set(_WORD_RE.findall(query_lower))
+        if not query_words:
+            return []
         
-        # Quick bloom filter check
-        if not any(word in self.bloom_filter for word in query_words):
+        # A query only matches if at least one of its words is indexed as a whole word.
+        # The bloom filter answers that once the whole wiki has been indexed; before then
+        # the vocabulary does, since every file searched has just been synced.
+        if self.bloom_ready and not any(word in self.bloom for word in query_words):
+            return []
+        query_ids = self._term_ids(query_words)
+        if not query_ids:
             return []
         
-        results = []
-        files = self._get_all_files()
+        # Past that check a phrase match can also come from inside longer words ("vm" in "vms"),
+        # and every word of a matching phrase lies inside some indexed term of the section
+        phrase_ids = self._terms_containing(max(query_words, key=len))
+        candidates = set()
+        for term_id in query_ids | phrase_ids:
+            candidates.update(section_id for file_id, section_id, _ in self.postings.get(term_id, ())
+                              if file_id in file_ranks)
         
-        # Filter files by pattern if specified
+        # Score in file then section order so equal scores keep document order
+        sections = self.sections
+        phrase_matches = self._phrase_matches(candidates, query_lower, query_words, phrase_ids)
+        avg_length = self._total_length / self._section_count if self._total_length else 1.0
+        scored = []
+        for section_id in sorted(candidates, key=lambda sid: (file_ranks[sections[sid]["file_id"]], sid)):
+            section = sections[section_id]
+            phrase_match = section_id in phrase_matches or query_lower in section["title_lower"]
+            score = self._calculate_relevance(section, phrase_match, query_ids, avg_length)
+            if score > 0:
+                scored.append((score, section))
+        
+        # Keep only the top results by relevance score
+        top = heapq.nlargest(max_results, scored, key=lambda item: item[0])
+        return [self._make_result(section, score) for score, section in top]
+    
+    def _phrase_matches(self, section_ids: Set[int], query_lower: str, query_words: Set[str],
+                        phrase_ids: Set[int]) -> Set[int]:
+        """
+        Get the ids of the given sections whose body contains query_lower.
+        phrase_ids (the terms containing the longest query word) rule out most sections from their
+        term counts; the bodies of the rest are sliced from their files' text, once per file.
+        """
+        sections = self.sections
+        possible = [section_id for section_id in section_ids
+                    if not phrase_ids.isdisjoint(sections[section_id]["term_freqs"])]
+        if query_lower in query_words:
+            # A single bare word is inside the body exactly when it is inside one of its terms
+            return set(possible)
+        
+        by_file = defaultdict(list)
+        for section_id in possible:
+            by_file[sections[section_id]["file"]].append(section_id)
+        matches = set()
+        for relative_path, file_section_ids in by_file.items():
+            content = self._get_file_text(self.docs_path / relative_path)
+            for section_id in file_section_ids:
+                start, end = sections[section_id]["span"]
+                if query_lower in content[start:end].lower():
+                    matches.add(section_id)
+        return matches
+    
+    def _get_file_text(self, file_path: Path) -> str:
+        """
+        Get an indexed file's decoded text, from file_cache while it was read at the fingerprint
+        the file was last indexed at. Keeps at most FILE_CACHE_CHARS characters of text.
+        """
+        entry = self.indexed_files.get(file_path)
+        file_key = entry[1] if entry is not None else None
+        cache = self.file_cache
+        cached = cache.get(file_path)
+        if cached is not None and file_key is not None and cached[0] == file_key:
+            cache.move_to_end(file_path)
+            return cached[1]
+        
+        text = self._read_file_chunked(file_path)
+        self._drop_file_text(file_path)
+        if file_key is not None and len(text) <= FILE_CACHE_CHARS:
+            cache[file_path] = (file_key, text)
+            self._file_cache_chars += len(text)
+            while self._file_cache_chars > FILE_CACHE_CHARS:
+                _, (_, evicted) = cache.popitem(last=False)
+                self._file_cache_chars -= len(evicted)
+        return text
+    
+    def _drop_file_text(self, file_path: Path) -> None:
+        """Remove a file's text from file_cache, if it is there."""
+        cached = self.file_cache.pop(file_path, None)
+        if cached is not None:
+            self._file_cache_chars -= len(cached[1])
+    
+    def _get_search_files(self, file_pattern: str) -> List[Path]:
+        """Get the files to search, filtered by file name pattern if specified."""
+        files = self._get_all_files()
         if file_pattern != "*":
             files = [f for f in files if fnmatch.fnmatch(f.name, file_pattern)]
-        
+        return files
+    
+    def _file_ranks(self, files: List[Path]) -> Dict[int, int]:
+        """Map the file ids of the given (sorted) files to their position in the list."""
+        indexed_files = self.indexed_files
+        return {indexed_files[file_path][0]: rank for rank, file_path in enumerate(files)}
+    
+    def _sync_index(self, files: List[Path], complete: bool = False) -> None:
+        """
+        Bring the inverted index up to date for the given files, re-indexing any that changed.
+        With complete=True the list is the whole wiki, so files missing from it are dropped.
+        """
+        indexed_files = self.indexed_files
+        stale = []
         for file_path in files:
-            file_hash = self._get_file_hash(file_path)
-            
-            # Check cache first
-            if file_hash in self.index_cache:
-                sections = self.index_cache[file_hash]
+            file_key = self._get_file_key(file_path)
+            entry = indexed_files.get(file_path)
+            if entry is None or entry[1] != file_key:
+                stale.append((file_path, file_key))
+        
+        if stale:
+            # Read and parse in worker threads; the index itself is only changed here
+            stale_paths = [file_path for file_path, _ in stale]
+            if len(stale) > 1:
+                parsed = self._get_executor().map(self._parse_file, stale_paths)
             else:
-                # Read and index file
-                content = self._read_file_chunked(file_path)
-                if not content:
-                    continue
-                    
-                sections = self._extract_sections(content, file_path)
-                
-                # Add word index to each section
-                for section in sections:
-                    section["words"] = self._build_word_index(section["content"])
-                
-                # Cache the indexed sections
-                self.index_cache[file_hash] = sections
-                
-                # Limit cache size
-                if len(self.index_cache) > self.max_cache_size:
-                    # Remove oldest entry (simple LRU approximation)
-                    oldest_key = next(iter(self.index_cache))
-                    del self.index_cache[oldest_key]
-            
-            # Search within sections
-            for section in sections:
-                score = self._calculate_relevance(section, query_words, query)
-                if score > 0:
-                    result = {
-                        "file": section.get("file", str(file_path.relative_to(self.docs_path))),
-                        "title": section["title"],
-                        "content": section["content"][:500] + "..." if len(section["content"]) > 500 else section["content"],
-                        "score": score,
-                        "line": section.get("line", 1),
-                        "level": section.get("level", 0)
-                    }
-                    results.append(result)
+                parsed = map(self._parse_file, stale_paths)
+            for (file_path, file_key), sections in zip(stale, parsed):
+                if file_path in indexed_files:
+                    self._remove_file(file_path)
+                self._index_file(file_path, file_key, sections)
         
-        # Sort by relevance score and return top results
-        results.sort(key=lambda x: x["score"], reverse=True)
-        return results[:max_results]
-    
-    def _calculate_relevance(self, section: Dict, query_words: Set[str], original_query: str) -> float:
-        """Calculate relevance score for a section."""
-        content = section["content"].lower()
-        title = section["title"].lower()
-        words = section.get("words", set())
+        if complete:
+            if len(indexed_files) > len(files):
+                for file_path in indexed_files.keys() - set(files):
+                    self._remove_file(file_path)
+            self.bloom_ready = True
         
-        score = 0.0
+        # Saving pickles the whole index, so searches only do it after many changes;
+        # warm_index and server shutdown save whatever is left
+        if self._unsaved_changes >= INDEX_SAVE_CHANGES:
+            self.save_index()
+    
+    def _load_index(self) -> None:
+        """
+        Restore the index saved by save_index, if there is a usable one.
+        Files are not checked here; the first search re-indexes any whose fingerprint changed.
+        """
+        try:
+            with open(self.index_path, 'rb') as f:
+                state = _IndexUnpickler(f).load()
+            if state.get("version") != INDEX_FORMAT_VERSION:
+                return
+            
+            capacity, num_bits, num_hashes, bits = state["bloom"]
+            bloom = BloomFilter.__new__(BloomFilter)
+            bloom.capacity, bloom.num_bits, bloom.num_hashes, bloom.bits = capacity, num_bits, num_hashes, bits
+            
+            self.vocab = state["vocab"]
+            self.postings = defaultdict(list, state["postings"])
+            self.sections = state["sections"]
+            self._free_section_ids = [section_id for section_id, section in enumerate(self.sections) if section is None]
+            self.indexed_files = {Path(path): entry for path, entry in state["indexed_files"].items()}
+            self._file_ids = {Path(path): file_id for path, file_id in state["file_ids"].items()}
+            self._section_count = state["section_count"]
+            self._total_length = state["total_length"]
+            self.bloom = bloom
+            if state.get("bloom_hash") != BLOOM_HASH_NAME:
+                # Saved with the other hash function: rebuild the bits from the vocabulary
+                self._rebuild_bloom()
+        except Exception:
+            # Missing, unreadable or incompatible index: start empty and index from scratch
+            return
+        self._vocab_dirty = True
+    
+    def save_index(self) -> bool:
+        """Atomically write the index if it changed since the last save. Returns False if it could not be written."""
+        if not self._unsaved_changes:
+            return True
+        bloom = self.bloom
+        state = {
+            "version": INDEX_FORMAT_VERSION,
+            "bloom": (bloom.capacity, bloom.num_bits, bloom.num_hashes, bloom.bits),
+            "bloom_hash": BLOOM_HASH_NAME,
+            "vocab": self.vocab,
+            "postings": dict(self.postings),
+            "sections": self.sections,
+            "indexed_files": {str(path): entry for path, entry in self.indexed_files.items()},
+            "file_ids": {str(path): file_id for path, file_id in self._file_ids.items()},
+            "section_count": self._section_count,
+            "total_length": self._total_length,
+        }
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix=self.index_path.name, dir=self.index_path.parent)
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+            return False
+        self._unsaved_changes = 0
+        return True
+    
+    def warm_index(self) -> int:
+        """Index the whole wiki ahead of the first search and save it. Returns the number of files indexed."""
+        files = self._get_all_files()
+        self._sync_index(files, complete=True)
+        self.save_index()
+        return len(files)
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Get the thread pool used to read and parse files, creating it on first use."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4))
+        return self._executor
+    
+    def _parse_file(self, file_path: Path) -> List[Dict]:
+        """Read a file and split it into sections with word counts. Safe to run in worker threads."""
+        content = self._read_file_chunked(file_path)
+        if not content:
+            return []
+        return self._extract_sections(content, file_path)
+    
+    def _index_file(self, file_path: Path, file_key: Optional[Tuple[int, int]], sections: List[Dict]) -> None:
+        """Add a parsed file's sections and their terms to the postings."""
+        file_id = self._file_ids.setdefault(file_path, len(self._file_ids))
+        section_ids = []
+        term_ids = set()
         
-        # Exact phrase match (highest priority)
-        if original_query.lower() in content:
-            score += 10.0
-        if original_query.lower() in title:
-            score += 15.0
+        if sections:
+            vocab = self.vocab
+            postings = self.postings
+            for section in sections:
+                term_freqs = self._build_word_index(section.pop("word_counts"))
+                # Title words get postings too, so title-only matches are still candidates
+                self._add_vocabulary(section["title_words"])
+                section_terms = term_freqs.keys() | {vocab[word] for word in section["title_words"]}
+                
+                # Smallest free id first, so a file's sections still get ids in document order
+                section_id = heapq.heappop(self._free_section_ids) if self._free_section_ids else len(self.sections)
+                section["file_id"] = file_id
+                section["term_freqs"] = term_freqs
+                section["title_ids"] = frozenset([vocab[word] for word in section["title_words"]])
+                section["length"] = sum(term_freqs.values())
+                if section_id == len(self.sections):
+                    self.sections.append(section)
+                else:
+                    self.sections[section_id] = section
+                self._section_count += 1
+                self._total_length += section["length"]
+                section_ids.append(section_id)
+                
+                for term_id in section_terms:
+                    postings[term_id].append((file_id, section_id, term_freqs.get(term_id, 0)))
+                term_ids |= section_terms
         
-        # Word matches in content
-        word_matches = len(query_words.intersection(words))
-        if word_matches > 0:
-            score += word_matches * 2.0
+        # Empty or unreadable files are recorded too, so they are not re-read on every search
+        self.indexed_files[file_path] = (file_id, file_key, section_ids, term_ids)
+        self._idf_cache.clear()
+        self._unsaved_changes += 1
+    
+    def _remove_file(self, file_path: Path) -> None:
+        """Drop a file's sections and postings from the index."""
+        file_id, _, section_ids, term_ids = self.indexed_files.pop(file_path)
+        self._drop_file_text(file_path)
+        postings = self.postings
+        for term_id in term_ids:
+            remaining = [posting for posting in postings[term_id] if posting[0] != file_id]
+            if remaining:
+                postings[term_id] = remaining
+            else:
+                del postings[term_id]
+        for section_id in section_ids:
+            self._section_count -= 1
+            self._total_length -= self.sections[section_id]["length"]
+            self.sections[section_id] = None
+            heapq.heappush(self._free_section_ids, section_id)
+        self._idf_cache.clear()
+        self._unsaved_changes += 1
+    
+    def _make_result(self, section: Dict, score: float) -> Dict:
+        """Build a search result entry for a matching section."""
+        return {
+            "file": section["file"],
+            "title": section["title"],
+            "content": section["preview"],
+            "score": score,
+            "line": section.get("line", 1),
+            "level": section.get("level", 0)
+        }
+    
+    def _idf(self, term_id: int) -> float:
+        """BM25 inverse document frequency of a term over the live sections."""
+        idf = self._idf_cache.get(term_id)
+        if idf is None:
+            df = len(self.postings.get(term_id, ()))
+            idf = math.log(1 + (self._section_count - df + 0.5) / (df + 0.5))
+            self._idf_cache[term_id] = idf
+        return idf
+    
+    def _calculate_relevance(self, section: Dict, phrase_match: bool, query_ids: FrozenSet[int],
+                             avg_length: float) -> float:
+        """Calculate the BM25 relevance score for a section, plus title and exact phrase boosts."""
+        term_freqs = section["term_freqs"]
+        title_ids = section["title_ids"]
+        length_norm = BM25_K1 * (1 - BM25_B + BM25_B * section["length"] / avg_length)
         
-        # Word matches in title (higher weight)
-        title_words = set(re.findall(r'\b\w{2,}\b', title))
-        title_matches = len(query_words.intersection(title_words))
-        if title_matches > 0:
-            score += title_matches * 5.0
+        score = 0.0
+        for term_id in query_ids:
+            tf = term_freqs.get(term_id, 0)
+            in_title = term_id in title_ids
+            if tf or in_title:
+                idf = self._idf(term_id)
+                score += idf * tf * (BM25_K1 + 1) / (tf + length_norm)
+                if in_title:
+                    score += idf * TITLE_BOOST
         
-        # Bonus for higher-level headers (more important sections)
-        if section.get("level", 0) <= 2:
-            score *= 1.2
+        # Exact phrase match
+        if phrase_match:
+            score += PHRASE_BOOST * sum(self._idf(term_id) for term_id in query_ids)
         
         return score
     
@@ -282,6 +764,50 @@ def search_wiki(
             "error": str(e)
         }
 
+@mcp.tool
+def batch_search_wiki(
+    queries: List[str],
+    max_results: int = 10,
+    file_pattern: str = "*"
+) -> Dict:
+    """
+    Search the Azure wiki documentation for several queries at once.
+    
+    Args:
+        queries: List of search terms or phrases
+        max_results: Maximum number of results to return per query (default: 10)
+        file_pattern: File name pattern to filter search (e.g., "*.md", "*azure*")
+    
+    Returns:
+        Dict containing:
+        - results: Mapping of each query to its list of matching sections (same shape as search_wiki)
+        - total_found: Mapping of each query to its number of matches
+        - search_time: Time taken to perform all searches
+        - queries_used: The queries that were searched
+    """
+    start_time = time.time()
+    
+    try:
+        results = search_engine.batch_search(queries, max_results, file_pattern)
+        search_time = time.time() - start_time
+        
+        return {
+            "results": results,
+            "total_found": {query: len(matches) for query, matches in results.items()},
+            "search_time": round(search_time, 3),
+            "queries_used": queries,
+            "status": "success"
+        }
+    except Exception as e:
+        return {
+            "results": {},
+            "total_found": {},
+            "search_time": time.time() - start_time,
+            "queries_used": queries,
+            "status": "error",
+            "error": str(e)
+        }
+
 @mcp.tool
 def get_wiki_file(file_path: str) -> Dict:
     """
@@ -373,16 +899,8 @@ def wiki_search_suggestions(partial_query: str) -> Dict:
         - based_on: The partial query used
     """
     try:
-        # Simple suggestion system based on bloom filter content
-        suggestions = []
-        partial_lower = partial_query.lower()
-        
-        # Find words in bloom filter that start with the partial query
-        matching_words = [word for word in search_engine.bloom_filter 
-                         if word.startswith(partial_lower) and len(word) > len(partial_lower)]
-        
-        # Sort by length (shorter = more likely to be useful) and take top 10
-        suggestions = sorted(matching_words, key=len)[:10]
+        # Prefix range over the sorted vocabulary; shorter words are more likely to be useful
+        suggestions = search_engine.suggest_words(partial_query.lower(), 10)
         
         return {
             "suggestions": suggestions,
@@ -1,11 +1,47 @@
 from fastmcp import FastMCP
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+import functools
 import json
+import mmap
+import os
 import re
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
 import ast
+from collections import OrderedDict
 
-mcp = FastMCP("Codebase Understanding MCP Server")
+try:
+    # google-re2 matches in linear time, so minified bundles with very long lines
+    # cannot make the JS import scan backtrack; _JS_IMPORT_RE keeps to the syntax
+    # it shares with the stdlib engine
+    import re2 as _js_regex
+except ImportError:
+    _js_regex = re
+
+# JSON output: orjson when the optional package is installed, else the stdlib encoder.
+# Both write two-space indented JSON; orjson leaves non-ASCII characters unescaped.
+try:
+    import orjson
+    
+    def _dump_json(obj) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+except ImportError:
+    def _dump_json(obj) -> str:
+        return json.dumps(obj, indent=2)
+
+@asynccontextmanager
+async def _lifespan(server: FastMCP) -> AsyncIterator[None]:
+    """Stop the import-extraction worker processes when the server shuts down."""
+    global _process_pool
+    try:
+        yield
+    finally:
+        if _process_pool is not None:
+            pool, _process_pool = _process_pool, None
+            pool.shutdown(wait=False, cancel_futures=True)
+
+mcp = FastMCP("Codebase Understanding MCP Server", lifespan=_lifespan)
 
 # Common files and directories to exclude from analysis
 EXCLUDE_PATTERNS = {
@@ -16,16 +52,41 @@ EXCLUDE_PATTERNS = {
     'bin', 'obj', '*.class', '*.jar', '*.war', '*.exe', '*.dll', '*.so', '*.dylib'
 }
 
+# EXCLUDE_PATTERNS split once into exact names and "*.ext" suffixes
+_EXCL_LITERALS = frozenset(p for p in EXCLUDE_PATTERNS if not p.startswith('*'))
+_EXCL_SUFFIXES = tuple(p[1:] for p in EXCLUDE_PATTERNS if p.startswith('*'))
+
 def should_exclude(path: Path) -> bool:
     """Check if a path should be excluded from analysis."""
     name = path.name
-    for pattern in EXCLUDE_PATTERNS:
-        if pattern.startswith('*'):
-            if name.endswith(pattern[1:]):
-                return True
-        elif name == pattern:
-            return True
-    return False
+    return name in _EXCL_LITERALS or name.endswith(_EXCL_SUFFIXES)
+
+def iter_source_files(root: Path, extensions) -> Iterator[Path]:
+    """
+    Yield files under root whose suffix is in extensions, skipping excluded names.
+    Excluded directories are pruned rather than walked, and each directory's
+    files are yielded before descending into its subdirectories.
+    """
+    try:
+        with os.scandir(root) as entries:
+            subdirs = []
+            for entry in entries:
+                name = entry.name
+                if name in _EXCL_LITERALS:
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif (not name.endswith(_EXCL_SUFFIXES)
+                          and os.path.splitext(name)[1] in extensions
+                          and entry.is_file()):
+                        yield Path(entry.path)
+                except OSError:
+                    continue
+    except OSError:
+        return
+    for subdir in subdirs:
+        yield from iter_source_files(subdir, extensions)
 
 @mcp.tool
 def generate_folder_structure(root_path: str, max_depth: int = 3) -> str:
@@ -44,103 +105,242 @@ def generate_folder_structure(root_path: str, max_depth: int = 3) -> str:
         return f"Error: Path '{root_path}' does not exist"
     
     lines = [f"Folder Structure for {root.name}/\n"]
+    indent_stack = []  # Indent segments of the directories above the entries being listed
     
-    def build_tree(path: Path, prefix: str = "", depth: int = 0) -> List[str]:
-        if depth > max_depth or should_exclude(path):
-            return []
-        
-        tree_lines = []
+    def build_tree(path: str, depth: int) -> None:
+        """Append the entries of directory path to lines, directories first."""
+        indent = "".join(indent_stack)
         try:
-            if path.is_file():
-                tree_lines.append(f"{prefix}{path.name}")
-            else:
-                tree_lines.append(f"{prefix}{path.name}/")
-                
-                # Get children, sort directories first, then files
-                children = []
-                try:
-                    children = sorted([p for p in path.iterdir() if not should_exclude(p)],
-                                    key=lambda p: (p.is_file(), p.name.lower()))
-                except PermissionError:
-                    tree_lines.append(f"{prefix}├── Permission denied")
-                    return tree_lines
+            # Get children, sort directories first, then files. scandir reports
+            # each entry's type from the directory listing, so no per-entry stat.
+            try:
+                with os.scandir(path) as entries:
+                    children = sorted([
+                        (entry.is_file(), entry.name.lower(), entry.name, entry.path)
+                        for entry in entries
+                        if not (entry.name in _EXCL_LITERALS or entry.name.endswith(_EXCL_SUFFIXES))
+                    ])
+            except PermissionError:
+                lines.append(f"{indent}├── Permission denied")
+                return
+            
+            last = len(children) - 1
+            for i, (is_file, _, name, child_path) in enumerate(children):
+                is_last = i == last
+                connector = "└── " if is_last else "├── "
                 
-                for i, child in enumerate(children):
-                    is_last = i == len(children) - 1
-                    child_prefix = prefix + ("└── " if is_last else "├── ")
-                    next_prefix = prefix + ("    " if is_last else "│   ")
-                    
-                    if child.is_file():
-                        tree_lines.append(f"{child_prefix}{child.name}")
-                    else:
-                        child_tree = build_tree(child, next_prefix, depth + 1)
-                        tree_lines.append(f"{child_prefix}{child.name}/")
-                        tree_lines.extend(child_tree)
+                if is_file:
+                    lines.append(f"{indent}{connector}{name}")
+                else:
+                    lines.append(f"{indent}{connector}{name}/")
+                    if depth + 1 <= max_depth:
+                        indent_stack.append("    " if is_last else "│   ")
+                        build_tree(child_path, depth + 1)
+                        indent_stack.pop()
                             
         except Exception as e:
-            tree_lines.append(f"{prefix}Error reading {path.name}: {str(e)}")
-        
-        return tree_lines
+            lines.append(f"{indent}Error reading {os.path.basename(path)}: {str(e)}")
     
-    tree_lines = build_tree(root)
-    lines.extend(tree_lines)
+    if not should_exclude(root):
+        if root.is_file():
+            lines.append(root.name)
+        else:
+            lines.append(f"{root.name}/")
+            build_tree(str(root), 0)
     
     return "\n".join(lines)
 
-def extract_python_imports(file_path: Path) -> Tuple[List[str], List[str]]:
-    """Extract imports from a Python file."""
+# JS/TS module specifiers: `... from 'x'`, `import('x')` and `require('x')` in one pass
+_JS_IMPORT_RE = _js_regex.compile(r'''(?:\bfrom\s*|\bimport\s*\(\s*|\brequire\s*\(\s*)['"]([^'"]+)['"]''')
+
+# Python import statements at any indentation, including parenthesized and backslash-continued ones
+# (group 1). Comments and string literals are matched first and skipped, the way tokenize would
+# see them, so import-looking lines inside docstrings and triple-quoted strings do not count.
+# A bytes pattern, so it can run over a memory-mapped file without decoding it first.
+_PY_IMPORT_RE = re.compile(
+    rb'#[^\n]*'
+    rb'|[rRbBuUfF]{0,2}(?:"""[^"\\]*(?:(?:\\.|"(?!""))[^"\\]*)*"""'
+    rb"|'''[^'\\]*(?:(?:\\.|'(?!''))[^'\\]*)*'''"
+    rb'|"[^"\\\n]*(?:\\.[^"\\\n]*)*"'
+    rb"|'[^'\\\n]*(?:\\.[^'\\\n]*)*')"
+    rb'|^[ \t]*(from[ \t]+[\w.]+[ \t]+import[ \t]*\([^)#]*(?:#[^\n]*[^)#]*)*\)|(?:from|import)[ \t](?:\\\r?\n|[^\n])*)',
+    re.MULTILINE | re.DOTALL
+)
+
+def _file_stat_key(file_path: Path) -> Optional[Tuple[int, int]]:
+    """Return the (mtime_ns, size) a cached extraction of file_path is valid for, or None if it cannot be stat'd."""
+    try:
+        stat = file_path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+# Files whose extracted imports are kept per extractor, least recently used dropped first
+IMPORT_CACHE_SIZE = 4096
+
+def _cache_by_file_stat(extract):
+    """
+    Memoize an import extractor per file, re-running it only when the file's mtime or size changes.
+    At most IMPORT_CACHE_SIZE files are kept, so a long-running server analysing many trees stays bounded.
+    """
+    cache = OrderedDict()  # Path -> (stat key, (local imports, external imports))
+    
+    def lookup(file_path: Path, key: Tuple[int, int]) -> Optional[Tuple[List[str], Set[str]]]:
+        """Get the cached result for file_path if it was extracted at this stat key."""
+        cached = cache.get(file_path)
+        if cached is None or cached[0] != key:
+            return None
+        cache.move_to_end(file_path)
+        return cached[1]
+    
+    def store(file_path: Path, key: Tuple[int, int], result: Tuple[List[str], Set[str]]) -> None:
+        """Cache result for file_path at this stat key, evicting the least recently used file."""
+        cache[file_path] = (key, result)
+        cache.move_to_end(file_path)
+        if len(cache) > IMPORT_CACHE_SIZE:
+            cache.popitem(last=False)
+    
+    @functools.wraps(extract)
+    def wrapper(file_path: Path) -> Tuple[List[str], Set[str]]:
+        key = _file_stat_key(file_path)
+        if key is None:
+            return extract(file_path)
+        result = lookup(file_path, key)
+        if result is None:
+            result = extract(file_path)
+            store(file_path, key, result)
+        local_imports, external_imports = result
+        return list(local_imports), set(external_imports)
+    
+    wrapper.cache = cache
+    wrapper.lookup = lookup
+    wrapper.store = store
+    return wrapper
+
+@_cache_by_file_stat
+def extract_python_imports(file_path: Path) -> Tuple[List[str], Set[str]]:
+    """
+    Extract imports from a Python file.
+    Only the statements matched by _PY_IMPORT_RE outside strings and comments are parsed,
+    rather than the whole module, and they are matched on a read-only memory map of the file,
+    so the source is never decoded into one str; ast.parse decodes each statement's bytes itself.
+    """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        tree = ast.parse(content)
         local_imports = []
-        external_imports = []
+        external_imports = set()
+        
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return local_imports, external_imports
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                statements = [statement for statement in _PY_IMPORT_RE.findall(mm) if statement]
         
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Import):
-                for name in node.names:
-                    external_imports.append(name.name.split('.')[0])
-            elif isinstance(node, ast.ImportFrom):
-                if node.module:
-                    if node.level > 0 or node.module.startswith('.'):
-                        # Relative import
-                        local_imports.append(node.module)
-                    else:
-                        # External import
-                        external_imports.append(node.module.split('.')[0])
+        for statement in statements:
+            try:
+                tree = ast.parse(statement)
+            except (SyntaxError, ValueError):
+                # e.g. Python 2 syntax, or a statement the pattern cut short
+                continue
+            
+            for node in tree.body:
+                if isinstance(node, ast.Import):
+                    for name in node.names:
+                        external_imports.add(name.name.split('.')[0])
+                elif isinstance(node, ast.ImportFrom):
+                    if node.module:
+                        if node.level > 0 or node.module.startswith('.'):
+                            # Relative import
+                            local_imports.append(node.module)
+                        else:
+                            # External import
+                            external_imports.add(node.module.split('.')[0])
                         
         return local_imports, external_imports
     except:
-        return [], []
+        return [], set()
 
-def extract_js_imports(file_path: Path) -> Tuple[List[str], List[str]]:
+@_cache_by_file_stat
+def extract_js_imports(file_path: Path) -> Tuple[List[str], Set[str]]:
     """Extract imports from JavaScript/TypeScript files."""
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
             content = f.read()
         
         local_imports = []
-        external_imports = []
+        external_imports = set()
         
         # Match import statements
-        import_patterns = [
-            r'import\s+.*\s+from\s+[\'"]([^\'"]+)[\'"]',
-            r'import\s*\(\s*[\'"]([^\'"]+)[\'"]\s*\)',
-            r'require\s*\(\s*[\'"]([^\'"]+)[\'"]\s*\)',
-        ]
-        
-        for pattern in import_patterns:
-            matches = re.findall(pattern, content)
-            for match in matches:
-                if match.startswith('.'):
-                    local_imports.append(match)
-                else:
-                    external_imports.append(match.split('/')[0])
+        for match in _JS_IMPORT_RE.findall(content):
+            if match.startswith('.'):
+                local_imports.append(match)
+            else:
+                external_imports.add(match.split('/')[0])
                     
         return local_imports, external_imports
     except:
-        return [], []
+        return [], set()
+
+# Files included in the dependency map, and the file names treated as entry points
+SOURCE_EXTENSIONS = frozenset({'.py', '.js', '.ts', '.jsx', '.tsx', '.vue', '.java', '.c', '.cpp', '.cs', '.go', '.rs', '.rb', '.php'})
+ENTRY_POINT_NAMES = frozenset({'main.py', 'app.py', 'server.py', 'index.js', 'main.js', 'app.js'})
+
+# Import extractor for each source suffix; other source files are mapped without imports
+_IMPORT_EXTRACTORS = {
+    '.py': extract_python_imports,
+    '.js': extract_js_imports,
+    '.ts': extract_js_imports,
+    '.jsx': extract_js_imports,
+    '.tsx': extract_js_imports,
+}
+
+# Below this many files to (re)parse, handing them to worker processes costs more than it saves
+PARALLEL_EXTRACT_MIN_FILES = 256
+
+_process_pool = None  # Worker processes for extract_imports, created on first use
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """Get the process pool used to extract imports, creating it on first use."""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor()
+    return _process_pool
+
+def _extract_uncached(file_path: Path) -> Tuple[List[str], Set[str]]:
+    """Run the extractor for file_path's suffix, bypassing its cache. Runs in pool workers."""
+    return _IMPORT_EXTRACTORS[file_path.suffix].__wrapped__(file_path)
+
+def extract_imports(files: List[Path]) -> List[Tuple[List[str], Set[str]]]:
+    """
+    Extract (local_imports, external_imports) for each file, in order.
+    Cached results are reused; when enough files are new or changed they are
+    parsed across worker processes, and the results are cached in this process.
+    """
+    results = []
+    stale = []  # (index into results, file, stat key) of files that need parsing
+    for file_path in files:
+        extract = _IMPORT_EXTRACTORS.get(file_path.suffix)
+        if extract is None:
+            results.append(([], set()))
+            continue
+        key = _file_stat_key(file_path)
+        cached = extract.lookup(file_path, key) if key is not None else None
+        if cached is not None:
+            results.append(cached)
+        else:
+            stale.append((len(results), file_path, key))
+            results.append(None)
+    
+    stale_paths = [file_path for _, file_path, _ in stale]
+    if len(stale_paths) >= PARALLEL_EXTRACT_MIN_FILES and (os.cpu_count() or 1) > 1:
+        parsed = _get_process_pool().map(_extract_uncached, stale_paths, chunksize=32)
+    else:
+        parsed = map(_extract_uncached, stale_paths)
+    for (i, file_path, key), result in zip(stale, parsed):
+        if key is not None:
+            _IMPORT_EXTRACTORS[file_path.suffix].store(file_path, key, result)
+        results[i] = result
+    
+    return [(list(local_imports), set(external_imports)) for local_imports, external_imports in results]
 
 @mcp.tool
 def build_dependency_map(root_path: str) -> str:
@@ -163,41 +363,36 @@ def build_dependency_map(root_path: str) -> str:
         "entry_points": []
     }
     
-    # Find all source files
-    source_extensions = {'.py', '.js', '.ts', '.jsx', '.tsx', '.vue', '.java', '.c', '.cpp', '.cs', '.go', '.rs', '.rb', '.php'}
+    # Walked paths all start with this prefix, so relative paths are sliced off it
+    root_prefix = os.path.join(str(root), '')
     
     def scan_directory(path: Path):
-        for item in path.rglob('*'):
-            if item.is_file() and not should_exclude(item) and item.suffix in source_extensions:
-                relative_path = str(item.relative_to(root)).replace('\\', '/')
-                
-                # Check if it's an entry point
-                if item.name in ['main.py', 'app.py', 'server.py', 'index.js', 'main.js', 'app.js']:
-                    dependency_map["entry_points"].append(relative_path)
-                
-                # Extract imports
-                local_imports = []
-                external_deps = []
-                
-                if item.suffix == '.py':
-                    local_imports, external_deps = extract_python_imports(item)
-                elif item.suffix in ['.js', '.ts', '.jsx', '.tsx']:
-                    local_imports, external_deps = extract_js_imports(item)
-                
-                dependency_map["files"][relative_path] = {
-                    "imports": local_imports,
-                    "external_deps": list(set(external_deps))
-                }
-                
-                # Track external dependencies
-                for dep in external_deps:
-                    if dep not in dependency_map["external_dependencies"]:
-                        dependency_map["external_dependencies"][dep] = []
-                    dependency_map["external_dependencies"][dep].append(relative_path)
+        # Find all source files
+        items = list(iter_source_files(path, SOURCE_EXTENSIONS))
+        
+        # Extract imports
+        for item, (local_imports, external_deps) in zip(items, extract_imports(items)):
+            relative_path = str(item)[len(root_prefix):].replace('\\', '/')
+            
+            # Check if it's an entry point
+            if item.name in ENTRY_POINT_NAMES:
+                dependency_map["entry_points"].append(relative_path)
+            
+            external_deps = sorted(external_deps)
+            dependency_map["files"][relative_path] = {
+                "imports": local_imports,
+                "external_deps": external_deps
+            }
+            
+            # Track external dependencies
+            for dep in external_deps:
+                if dep not in dependency_map["external_dependencies"]:
+                    dependency_map["external_dependencies"][dep] = []
+                dependency_map["external_dependencies"][dep].append(relative_path)
     
     scan_directory(root)
     
-    return json.dumps(dependency_map, indent=2)
+    return _dump_json(dependency_map)
 
 if __name__ == "__main__":
     mcp.run()
\ No newline at end of file
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Test script for Codebase Understanding MCP server functionality.
+Tests import extraction on small sample files.
+"""
+
+import sys
+import os
+import tempfile
+from pathlib import Path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from server import extract_python_imports
+
+def test_extract_python_imports():
+    """Test that only real import statements are reported."""
+    
+    print("🧪 Testing Codebase Understanding MCP Server")
+    print("=" * 50)
+    
+    sample_source = (
+        'import os\n'
+        '"""\n'
+        'import requests\n'
+        'from flask import Flask\n'
+        '"""\n'
+        'x = """\n'
+        'import numpy\n'
+        '"""\n'
+        '# import yaml\n'
+        'def load():\n'
+        '    from .models import Model\n'
+        '    import json, pathlib.util\n'
+        'from typing import (  # (for Dict)\n'
+        '    Dict,\n'
+        ')\n'
+    )
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sample_file = Path(tmp_dir) / "sample.py"
+        sample_file.write_text(sample_source)
+        
+        # Test 1: Docstrings, strings and comments are skipped
+        print("\n📋 Test 1: Imports outside strings and comments")
+        local_imports, external_imports = extract_python_imports(sample_file)
+        print(f"Local imports: {local_imports}")
+        print(f"External imports: {sorted(external_imports)}")
+        assert external_imports == {"os", "json", "pathlib", "typing"}, "Should ignore imports inside strings and comments"
+        assert local_imports == ["models"], "Should report relative imports as local"
+    
+    print("\n✅ All tests passed!")
+
+if __name__ == "__main__":
+    test_extract_python_imports()
@@ -0,0 +1,94 @@
+"""
+Local file scanning for the deep search server's Python fallback, shared with its worker processes.
+This module only imports the standard library: pool workers started by spawning a new
+interpreter import it to unpickle scan_files, so it must stay cheap to import.
+"""
+
+import functools
+import re
+from collections import deque
+from typing import Iterable, Iterator, List, TextIO, Tuple
+
+def stream_contains(f: TextIO, pattern: re.Pattern, overlap: int, chunk_size: int = 65536) -> bool:
+    """
+    Check whether pattern matches anywhere in the text file f, reading it in chunks.
+    The last overlap characters of each chunk are carried into the next, so a match
+    up to overlap + 1 characters long is found even when it straddles a boundary.
+    """
+    tail = ''
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return False
+        window = tail + chunk if tail else chunk
+        if pattern.search(window):
+            return True
+        tail = window[-overlap:] if overlap else ''
+
+def matching_snippets(lines: Iterable[str], pattern: re.Pattern, limit: int,
+                       context: int = 3) -> Iterator[Tuple[int, str, int]]:
+    """
+    Stream lines and yield (line_number, snippet, hit_count) for up to limit lines that
+    pattern matches, each snippet holding context lines either side of its match.
+    Only the preceding context lines and the snippets still waiting for their trailing
+    lines are kept in memory, never the whole file.
+    """
+    before = deque(maxlen=context)
+    pending = deque()  # [line_number, lines, hit_count, trailing lines still wanted]
+    found = 0
+    for line_number, line in enumerate(lines, 1):
+        line = line.rstrip('\n')
+        for snippet in pending:
+            snippet[1].append(line)
+            snippet[3] -= 1
+        while pending and pending[0][3] == 0:
+            done = pending.popleft()
+            yield done[0], '\n'.join(done[1]), done[2]
+        
+        if found < limit:
+            hits = pattern.findall(line)
+            if hits:
+                found += 1
+                pending.append([line_number, [*before, line], len(hits), context])
+        elif not pending:
+            return
+        before.append(line)
+    
+    for done in pending:
+        yield done[0], '\n'.join(done[1]), done[2]
+
+@functools.lru_cache(maxsize=32)
+def query_words_regex(query_words: Tuple[str, ...]) -> re.Pattern:
+    # The words are matched by one compiled alternation, longest first so overlapping
+    # words match the longer one, and re.IGNORECASE stands in for lowercasing every
+    # file and line.
+    return re.compile('|'.join(map(re.escape, query_words)), re.IGNORECASE)
+
+def scan_files(paths: List[str], query_words: Tuple[str, ...],
+               limit: int) -> List[Tuple[str, int, str, int]]:
+    """
+    Scan paths in order for query_words and return up to limit (file_path, line_number,
+    snippet, hit_count) matches. Runs in the server process or in its pool workers.
+    """
+    word_re = query_words_regex(query_words)
+    overlap = len(query_words[0]) - 1  # Enough carried-over text for a word split across chunks
+    found = []
+    
+    for path in paths:
+        try:
+            with open(path, 'r', encoding='utf-8', errors='ignore', buffering=65536) as f:
+                # Check if query words appear in the file
+                if stream_contains(f, word_re, overlap):
+                    # Extract relevant code snippets
+                    f.seek(0)
+                    for line_number, snippet, hits in matching_snippets(f, word_re, limit - len(found)):
+                        found.append((path, line_number, snippet, hits))
+        
+        except Exception:
+            continue  # Skip files that can't be read
+        
+        # Stop scanning once enough snippets are collected
+        if len(found) >= limit:
+            break
+    
+    return found
@@ -1,8 +1,22 @@
 import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import aclosing, asynccontextmanager, suppress
+import copy
+import functools
+import heapq
+import inspect
+import itertools
+import multiprocessing
+import operator
 import os
+from collections import Counter, deque
 import json
 import re
-from typing import List, Dict, Any, Optional
+import shutil
+import sqlite3
+import time
+import zlib
+from typing import AsyncIterator, Awaitable, Callable, Iterator, List, Dict, Any, Optional, Tuple
 from fastmcp import FastMCP
 from crawl4ai import AsyncWebCrawler, CrawlerRunConfig
 from crawl4ai.content_scraping_strategy import LXMLWebScrapingStrategy
@@ -19,8 +33,217 @@ import httpx
 from pathlib import Path
 import ast
 import subprocess
+from local_search import scan_files
 
-mcp = FastMCP("DeepSearch")
+try:
+    import h2  # noqa: F401 - lets httpx negotiate HTTP/2
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+_http_client: Optional[httpx.AsyncClient] = None  # Shared by the web searches, created on first use
+_http_client_loop: Optional[asyncio.AbstractEventLoop] = None  # Loop the client's connections belong to
+
+def _get_http_client() -> httpx.AsyncClient:
+    """
+    Get the pooled HTTP client for API searches, creating it on first use.
+    Keeping connections alive between searches skips a TCP and TLS handshake with
+    api.stackexchange.com / api.github.com per call. Pooled connections belong to
+    the event loop that opened them, so a client is never reused across loops.
+    """
+    global _http_client, _http_client_loop
+    loop = asyncio.get_running_loop()
+    if _http_client is None or _http_client_loop is not loop:
+        _http_client = httpx.AsyncClient(
+            http2=_HTTP2,
+            timeout=10.0,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+        _http_client_loop = loop
+    return _http_client
+
+@asynccontextmanager
+async def _lifespan(server: FastMCP) -> AsyncIterator[None]:
+    """Close the pooled HTTP client and stop search worker processes when the server shuts down."""
+    global _http_client, _process_pool
+    try:
+        yield
+    finally:
+        if _http_client is not None:
+            client, _http_client = _http_client, None
+            await client.aclose()
+        if _process_pool is not None:
+            pool, _process_pool = _process_pool, None
+            pool.shutdown(wait=False, cancel_futures=True)
+
+mcp = FastMCP("DeepSearch", lifespan=_lifespan)
+
+class _TTLCache:
+    """
+    Small in-memory LRU cache whose entries expire ttl seconds after they are stored.
+    Values are deep-copied on the way in and out, so callers can't mutate cached results.
+    """
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> (stored at, value); a dict keeps insertion order, so it doubles as
+        # the LRU list (oldest first)
+        self._entries: Dict[Any, Tuple[float, Any]] = {}
+    
+    def get(self, key: Any) -> Optional[Any]:
+        """Return a copy of the live value for key, or None"""
+        entry = self._entries.pop(key, None)
+        if entry is None or time.monotonic() - entry[0] >= self.ttl:
+            return None
+        self._entries[key] = entry  # Most recently used goes last
+        return copy.deepcopy(entry[1])
+    
+    def put(self, key: Any, value: Any) -> None:
+        """Store a copy of value under key, evicting the least recently used entries"""
+        self._entries.pop(key, None)
+        self._entries[key] = (time.monotonic(), copy.deepcopy(value))
+        while len(self._entries) > self.maxsize:
+            del self._entries[next(iter(self._entries))]
+
+class _PersistentCache:
+    """
+    SQLite-backed key/value cache that survives restarts. Entries expire ttl seconds
+    after they are stored and are kept as zlib-compressed JSON. Database errors are
+    treated as misses, so a broken cache file never fails a search.
+    """
+    
+    def __init__(self, path: str, ttl: float):
+        self.ttl = ttl
+        # Autocommit; WAL lets several server processes read while one writes
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, ts REAL NOT NULL, value BLOB NOT NULL)')
+        self._db.execute('DELETE FROM cache WHERE ts <= ?', (time.time() - ttl,))
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Return the live value for key, or None"""
+        try:
+            row = self._db.execute('SELECT value FROM cache WHERE key = ? AND ts > ?',
+                                   (key, time.time() - self.ttl)).fetchone()
+            return json.loads(zlib.decompress(row[0])) if row else None
+        except (sqlite3.Error, zlib.error, ValueError):
+            return None
+    
+    def put(self, key: str, value: Any) -> None:
+        """Store value under key, replacing any older entry"""
+        try:
+            self._db.execute('INSERT OR REPLACE INTO cache (key, ts, value) VALUES (?, ?, ?)',
+                             (key, time.time(), zlib.compress(json.dumps(value).encode('utf-8'))))
+        except sqlite3.Error:
+            pass
+
+def _coalesce_concurrent(fn: Callable[..., Awaitable[Dict[str, Any]]]) -> Callable[..., Awaitable[Dict[str, Any]]]:
+    """
+    Decorate an async function so that concurrent calls with the same arguments share
+    one run: the first call does the work and the others await its result, each
+    getting their own copy. Calls made after it finishes start a new run.
+    """
+    signature = inspect.signature(fn)
+    inflight: Dict[Tuple, asyncio.Future] = {}  # Call arguments -> result of the running call
+    
+    @functools.wraps(fn)
+    async def wrapper(*args: Any, **kwargs: Any) -> Dict[str, Any]:
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = tuple(bound.arguments.items())
+        
+        while (future := inflight.get(key)) is not None:
+            try:
+                # shield: a waiter being cancelled must not cancel the shared run
+                return copy.deepcopy(await asyncio.shield(future))
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # This call itself was cancelled
+                # The caller doing the work was cancelled; take over the run
+        
+        future = inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn(*args, **kwargs)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # Retrieved here, so an unawaited failure isn't logged twice
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            inflight.pop(key, None)
+    
+    return wrapper
+
+# Web and crawl results change slowly, so they are reused for a few minutes
+WEB_CACHE_TTL_SECONDS = 600
+
+# Dependency, build and cache directories never worth searching for source code
+IGNORE_DIRS = frozenset({'node_modules', '.git', '.venv', 'venv', 'dist', 'build', '__pycache__', 'target', '.next'})
+
+# Minified or bundled sources and source maps, whose matches are noise
+GENERATED_SUFFIXES = ('.min.js', '.bundle.js', '.map')
+
+# Larger files are skipped by the local search
+MAX_SEARCH_FILE_SIZE = 1_000_000
+
+def _scandir_recursive(path: str, ignore_dirs: frozenset = frozenset()) -> Iterator[os.DirEntry]:
+    """
+    Yield a DirEntry for every file under path, skipping names that start with '.'.
+    Hidden directories such as .git or .venv, and any directory named in ignore_dirs,
+    are pruned rather than walked, and entry types come from scandir's cached
+    directory data instead of a stat per path.
+    """
+    try:
+        with os.scandir(path) as entries:
+            subdirs = []
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in ignore_dirs:
+                            subdirs.append(entry.path)
+                    elif entry.is_file():
+                        yield entry
+                except OSError:
+                    continue
+    except OSError:
+        return
+    for subdir in subdirs:
+        yield from _scandir_recursive(subdir, ignore_dirs)
+
+# Common code block patterns; the code is each pattern's last group. HTML tag attributes
+# and bodies are length-capped so an unterminated tag costs a bounded scan from each
+# opening, not a scan to the end of the answer; only the first 1000 characters of a
+# snippet are kept anyway. Fences are not capped: a failed opening fence would leave its
+# closing fence to be taken as the next opening, pairing the prose between two blocks.
+# Uncapped, an opening fence can only fail when no fence follows it, so the scan stays linear.
+_CODE_BLOCK_PATTERNS = [
+    re.compile(r'```(\w+)?\n(.*?)```', re.DOTALL),  # Markdown code blocks
+    re.compile(r'<code[^>]{0,200}>(.{1,20000}?)</code>', re.DOTALL),  # HTML code tags
+    re.compile(r'<pre[^>]{0,200}>(.{1,20000}?)</pre>', re.DOTALL),   # HTML pre tags
+]
+
+# Function definition patterns for the regex fallback in analyze_code_context
+_FUNCTION_PATTERNS = {language: re.compile(pattern) for language, pattern in {
+    'python': r'def\s+(\w+)\s*\(',
+    'javascript': r'(?:function\s+(\w+)\s*\(|(\w+)\s*[:=]\s*(?:function\s*\(|async\s*\(|\([^)]*\)\s*=>))',
+    'typescript': r'(?:function\s+(\w+)\s*\(|(\w+)\s*[:=]\s*(?:function\s*\(|async\s*\(|\([^)]*\)\s*=>))',
+    'java': r'(?:public|private|protected)?\s*(?:static)?\s*\w+\s+(\w+)\s*\(',
+    'go': r'func\s+(\w+)\s*\(',
+    'rust': r'fn\s+(\w+)\s*\(',
+    'cpp': r'(?:inline\s+)?(?:virtual\s+)?(?:static\s+)?\w+\s+(\w+)\s*\(',
+    'csharp': r'(?:public|private|protected)?\s*(?:static)?\s*\w+\s+(\w+)\s*\('
+}.items()}
+
+_IDENTIFIER_RE = re.compile(r'\b[a-zA-Z_][a-zA-Z0-9_]*\b')
 
 class CodeAnalyzer:
     """Analyzes code context and provides intelligent search assistance"""
@@ -30,18 +253,11 @@ class CodeAnalyzer:
         """Extract code snippets from content with language detection"""
         snippets = []
         
-        # Common code block patterns
-        code_patterns = [
-            r'```(\w+)?\n(.*?)```',  # Markdown code blocks
-            r'<code[^>]*>(.*?)</code>',  # HTML code tags
-            r'<pre[^>]*>(.*?)</pre>',   # HTML pre tags
-        ]
-        
-        for pattern in code_patterns:
-            matches = re.finditer(pattern, content, re.DOTALL)
+        for pattern in _CODE_BLOCK_PATTERNS:
+            matches = pattern.finditer(content)
             for match in matches:
-                language = match.group(1) if len(match.groups()) > 1 else 'unknown'
-                code = match.group(-1).strip()
+                language = match.group(1) if pattern.groups > 1 else 'unknown'
+                code = match.group(pattern.groups).strip()
                 if len(code) > 10:  # Skip very short snippets
                     snippets.append({
                         'language': language or 'unknown',
@@ -51,9 +267,56 @@ class CodeAnalyzer:
         
         return snippets
     
+    # Config files that identify a workspace's language, in detection order
+    CONFIG_FILES = {
+        'package.json': 'javascript',
+        'requirements.txt': 'python',
+        'Cargo.toml': 'rust',
+        'go.mod': 'go',
+        'pom.xml': 'java',
+        'Gemfile': 'ruby',
+        'composer.json': 'php',
+    }
+    
     @staticmethod
     def analyze_workspace_context(workspace_path: Optional[str] = None) -> Dict[str, Any]:
-        """Analyze current workspace for context"""
+        """
+        Analyze current workspace for context.
+        The result is cached per workspace until the workspace directory or one of its
+        config files changes mtime. Adding or removing an entry directly under the
+        workspace bumps the directory's mtime; changes deeper in the tree do not.
+        """
+        if not workspace_path or not os.path.exists(workspace_path):
+            workspace_path = os.getcwd()
+        workspace_path = os.path.abspath(workspace_path)
+        
+        try:
+            stat_key = CodeAnalyzer._workspace_stat_key(workspace_path)
+        except OSError:
+            return CodeAnalyzer._scan_workspace_context(workspace_path)
+        # Copied so callers can't mutate the cached context
+        return copy.deepcopy(CodeAnalyzer._cached_workspace_context(workspace_path, stat_key))
+    
+    @staticmethod
+    def _workspace_stat_key(workspace_path: str) -> Tuple[Optional[int], ...]:
+        """Return the mtimes, in ns, of the workspace directory and its config files (None if missing)."""
+        mtimes = [os.stat(workspace_path).st_mtime_ns]
+        for config_file in CodeAnalyzer.CONFIG_FILES:
+            try:
+                mtimes.append(os.stat(os.path.join(workspace_path, config_file)).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def _cached_workspace_context(workspace_path: str, stat_key: Tuple[Optional[int], ...]) -> Dict[str, Any]:
+        """Scan a workspace once per (workspace_path, stat_key)."""
+        return CodeAnalyzer._scan_workspace_context(workspace_path)
+    
+    @staticmethod
+    def _scan_workspace_context(workspace_path: str) -> Dict[str, Any]:
+        """Detect the languages, dependencies and file types of workspace_path."""
         context = {
             'languages': [],
             'frameworks': [],
@@ -61,25 +324,12 @@ class CodeAnalyzer:
             'file_types': {},
         }
         
-        if not workspace_path or not os.path.exists(workspace_path):
-            workspace_path = os.getcwd()
-        
         try:
             # Detect languages and frameworks from common files
             workspace = Path(workspace_path)
             
             # Check for common config files
-            config_files = {
-                'package.json': 'javascript',
-                'requirements.txt': 'python',
-                'Cargo.toml': 'rust',
-                'go.mod': 'go',
-                'pom.xml': 'java',
-                'Gemfile': 'ruby',
-                'composer.json': 'php',
-            }
-            
-            for config_file, language in config_files.items():
+            for config_file, language in CodeAnalyzer.CONFIG_FILES.items():
                 if (workspace / config_file).exists():
                     context['languages'].append(language)
                     
@@ -97,16 +347,15 @@ class CodeAnalyzer:
                     except Exception:
                         pass
             
-            # Count file types
-            for file_path in workspace.rglob('*'):
-                if file_path.is_file() and not any(part.startswith('.') for part in file_path.parts):
-                    ext = file_path.suffix.lower()
-                    if ext:
-                        context['file_types'][ext] = context['file_types'].get(ext, 0) + 1
+            # Count file types, skipping dependency and build output trees
+            file_types = Counter()
+            for entry in _scandir_recursive(workspace_path, IGNORE_DIRS):
+                ext = os.path.splitext(entry.name)[1].lower()
+                if ext:
+                    file_types[ext] += 1
             
             # Keep only top file types
-            context['file_types'] = dict(sorted(context['file_types'].items(), 
-                                              key=lambda x: x[1], reverse=True)[:10])
+            context['file_types'] = dict(file_types.most_common(10))
             
         except Exception as e:
             context['error'] = str(e)
@@ -138,6 +387,29 @@ async def smart_code_search(
         Comprehensive results with ranked code snippets, sources, and related search suggestions
     """
     
+    return await _do_search(query, workspace_path, language_hint, include_web, include_local)
+
+# Every snippet source sets relevance_score. heapq.nlargest keeps the top n in
+# O(N log n) and, like a stable reverse sort, keeps ties in their original order.
+_relevance_key = operator.itemgetter('relevance_score')
+
+# Recent search results, keyed by the search arguments
+SEARCH_CACHE_TTL_SECONDS = 300
+_search_cache = _TTLCache(maxsize=128, ttl=SEARCH_CACHE_TTL_SECONDS)
+
+@_coalesce_concurrent
+async def _do_search(query: str, workspace_path: Optional[str], language_hint: Optional[str],
+                     include_web: bool, include_local: bool) -> Dict[str, Any]:
+    """
+    Run a multi-source search for smart_code_search and refine_search. Results are
+    cached for SEARCH_CACHE_TTL_SECONDS, unless one of the sources failed, and callers
+    always get their own copy.
+    """
+    key = (query, workspace_path, language_hint, include_web, include_local)
+    cached = _search_cache.get(key)
+    if cached is not None:
+        return cached
+    
     results = {
         'query': query,
         'context': {},
@@ -168,11 +440,14 @@ async def smart_code_search(
         search_tasks.append(_search_local_files(query, workspace_path, language_hint))
     
     # Execute searches in parallel
+    failed = False
     if search_tasks:
         search_results = await asyncio.gather(*search_tasks, return_exceptions=True)
         
         for result in search_results:
-            if isinstance(result, dict) and not isinstance(result, Exception):
+            if isinstance(result, BaseException) or 'error' in result:
+                failed = True  # Don't cache a partial result; the next call retries
+            if isinstance(result, dict) and not isinstance(result, BaseException):
                 if 'snippets' in result:
                     results['code_snippets'].extend(result['snippets'])
                 if 'sources' in result:
@@ -184,15 +459,41 @@ async def smart_code_search(
     results['related_searches'] = _generate_related_searches(query, language_hint, results['context'])
     
     # Rank and limit results
-    results['code_snippets'] = sorted(results['code_snippets'], 
-                                    key=lambda x: x.get('relevance_score', 0), reverse=True)[:10]
+    results['code_snippets'] = heapq.nlargest(10, results['code_snippets'], key=_relevance_key)
     results['sources'] = results['sources'][:15]
     results['explanations'] = results['explanations'][:5]
     
+    if not failed:
+        _search_cache.put(key, results)
+    
     return results
 
+_stackoverflow_cache = _TTLCache(maxsize=256, ttl=WEB_CACHE_TTL_SECONDS)
+
+# Set DEEP_SEARCH_CACHE_DB to a file path to also keep Stack Overflow answers on disk,
+# so they survive server restarts
+PERSISTENT_CACHE_TTL_SECONDS = 24 * 60 * 60
+_PERSISTENT_CACHE_PATH = os.getenv("DEEP_SEARCH_CACHE_DB", "")
+_stackoverflow_disk_cache = None
+if _PERSISTENT_CACHE_PATH:
+    try:
+        _stackoverflow_disk_cache = _PersistentCache(_PERSISTENT_CACHE_PATH, PERSISTENT_CACHE_TTL_SECONDS)
+    except sqlite3.Error:
+        pass  # Unusable path or file; run with the in-memory cache only
+
+@_coalesce_concurrent
 async def _search_stackoverflow(query: str, language_hint: Optional[str] = None) -> Dict[str, Any]:
-    """Search Stack Overflow for relevant questions and answers"""
+    """Search Stack Overflow for relevant questions and answers, reusing recent answers"""
+    key = (query, language_hint)
+    cached = _stackoverflow_cache.get(key)
+    if cached is not None:
+        return cached
+    if _stackoverflow_disk_cache is not None:
+        cached = _stackoverflow_disk_cache.get(json.dumps(key))
+        if cached is not None:
+            _stackoverflow_cache.put(key, cached)
+            return cached
+    
     results = {'snippets': [], 'sources': [], 'explanations': []}
     
     try:
@@ -208,36 +509,46 @@ async def _search_stackoverflow(query: str, language_hint: Optional[str] = None)
         if language_hint:
             params['tagged'] = language_hint
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                'https://api.stackexchange.com/2.3/search/advanced',
-                params=params,
-                timeout=10
-            )
+        response = await _get_http_client().get(
+            'https://api.stackexchange.com/2.3/search/advanced',
+            params=params,
+            timeout=10
+        )
+        
+        if response.status_code == 200:
+            data = response.json()
+            items = data.get('items', [])[:5]
             
-            if response.status_code == 200:
-                data = response.json()
+            # Extract code snippets from answers in worker threads, so the regex work
+            # neither blocks the event loop nor runs one answer at a time
+            snippets_per_item = await asyncio.gather(*(
+                asyncio.to_thread(CodeAnalyzer.extract_code_snippets, item.get('body', ''))
+                for item in items
+            ))
+            
+            for item, snippets in zip(items, snippets_per_item):
+                body = item.get('body', '')
                 
-                for item in data.get('items', [])[:5]:
-                    # Extract code snippets from answers
-                    body = item.get('body', '')
-                    snippets = CodeAnalyzer.extract_code_snippets(body)
-                    
-                    for snippet in snippets[:2]:  # Limit snippets per answer
-                        snippet['source'] = 'stackoverflow'
-                        snippet['source_url'] = item.get('link', '')
-                        snippet['title'] = item.get('title', '')
-                        snippet['score'] = item.get('score', 0)
-                        results['snippets'].append(snippet)
-                    
-                    # Add source info
-                    results['sources'].append({
-                        'title': item.get('title', ''),
-                        'url': item.get('link', ''),
-                        'source': 'Stack Overflow',
-                        'score': item.get('score', 0),
-                        'summary': body[:200] + '...' if len(body) > 200 else body
-                    })
+                for snippet in snippets[:2]:  # Limit snippets per answer
+                    snippet['source'] = 'stackoverflow'
+                    snippet['source_url'] = item.get('link', '')
+                    snippet['title'] = item.get('title', '')
+                    snippet['score'] = item.get('score', 0)
+                    results['snippets'].append(snippet)
+                
+                # Add source info
+                results['sources'].append({
+                    'title': item.get('title', ''),
+                    'url': item.get('link', ''),
+                    'source': 'Stack Overflow',
+                    'score': item.get('score', 0),
+                    'summary': body[:200] + '...' if len(body) > 200 else body
+                })
+            
+            # Only complete answers are cached; throttled or failed requests are retried
+            _stackoverflow_cache.put(key, results)
+            if _stackoverflow_disk_cache is not None:
+                _stackoverflow_disk_cache.put(json.dumps(key), results)
     
     except Exception as e:
         results['error'] = f"Stack Overflow search failed: {str(e)}"
@@ -260,34 +571,182 @@ async def _search_github(query: str, language_hint: Optional[str] = None) -> Dic
             'order': 'desc'
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                'https://api.github.com/search/repositories',
-                params=params,
-                timeout=10,
-                headers={'Accept': 'application/vnd.github.v3+json'}
-            )
+        response = await _get_http_client().get(
+            'https://api.github.com/search/repositories',
+            params=params,
+            timeout=10,
+            headers={'Accept': 'application/vnd.github.v3+json'}
+        )
+        
+        if response.status_code == 200:
+            data = response.json()
             
-            if response.status_code == 200:
-                data = response.json()
-                
-                for repo in data.get('items', [])[:3]:
-                    results['sources'].append({
-                        'title': repo.get('full_name', ''),
-                        'url': repo.get('html_url', ''),
-                        'source': 'GitHub Repository',
-                        'stars': repo.get('stargazers_count', 0),
-                        'description': repo.get('description', ''),
-                        'language': repo.get('language', '')
-                    })
+            for repo in data.get('items', [])[:3]:
+                results['sources'].append({
+                    'title': repo.get('full_name', ''),
+                    'url': repo.get('html_url', ''),
+                    'source': 'GitHub Repository',
+                    'stars': repo.get('stargazers_count', 0),
+                    'description': repo.get('description', ''),
+                    'language': repo.get('language', '')
+                })
     
     except Exception as e:
         results['error'] = f"GitHub search failed: {str(e)}"
     
     return results
 
+# Files per unit of work when the Python search fans out to worker processes. The
+# first chunk is always scanned in this process, so small workspaces and early hits
+# never pay for starting the pool.
+PARALLEL_SEARCH_CHUNK_FILES = 64
+
+# Files scanned in this process before the pool is used when its workers start by spawning
+# a new interpreter (the default on macOS and Windows) rather than forking. Each spawned
+# worker re-runs this script's imports (fastmcp, crawl4ai) before it can scan anything,
+# which takes seconds; a serial scan of this many files takes about as long.
+PARALLEL_SEARCH_SPAWN_MIN_FILES = 32768
+
+_process_pool = None  # Worker processes for _walk_local_snippets, created on first use
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """Get the process pool used to search local files, creating it on first use."""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor()
+    return _process_pool
+
+def _serial_search_chunks() -> int:
+    """Get the number of chunks _walk_local_snippets scans in this process before using the pool."""
+    if multiprocessing.get_start_method() == 'fork':
+        return 1
+    return PARALLEL_SEARCH_SPAWN_MIN_FILES // PARALLEL_SEARCH_CHUNK_FILES
+
+def _iter_search_chunks(workspace_path: str, search_extensions: List[str]) -> Iterator[List[str]]:
+    """Yield the paths of the searchable files under workspace_path, in walk order, in chunks."""
+    chunk = []
+    for entry in _scandir_recursive(workspace_path, IGNORE_DIRS):
+        name = entry.name
+        if os.path.splitext(name)[1].lower() not in search_extensions or name.endswith(GENERATED_SUFFIXES):
+            continue
+        # Skip empty and oversized (usually generated or vendored) files without opening them
+        try:
+            size = entry.stat().st_size
+        except OSError:
+            continue
+        if size == 0 or size > MAX_SEARCH_FILE_SIZE:
+            continue
+        chunk.append(entry.path)
+        if len(chunk) == PARALLEL_SEARCH_CHUNK_FILES:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _walk_local_snippets(workspace_path: str, query_words: List[str], search_extensions: List[str],
+                         limit: int) -> List[Tuple[str, int, str, int]]:
+    """
+    Search the workspace in Python, for when ripgrep is not installed.
+    Returns up to limit (file_path, line_number, snippet, hit_count) matches in walk order.
+    
+    After the first _serial_search_chunks() chunks, files are scanned chunk by chunk
+    across worker processes on multi-core machines. Chunk results are consumed in order,
+    so the matches are the same as a serial scan, and no further chunks are started once
+    enough are found.
+    """
+    words = tuple(query_words)
+    chunks = _iter_search_chunks(workspace_path, search_extensions)
+    workers = os.cpu_count() or 1
+    
+    # Scan in this process first: everything on one core, else until the pool is worth starting
+    found = []
+    for chunk in chunks if workers == 1 else itertools.islice(chunks, _serial_search_chunks()):
+        found += scan_files(chunk, words, limit - len(found))
+        if len(found) >= limit:
+            return found
+    
+    # Keep a few chunks in flight per worker while the walk continues
+    pending = deque()
+    try:
+        for chunk in chunks:
+            if len(found) >= limit:
+                break
+            pending.append(_get_process_pool().submit(scan_files, chunk, words, limit))
+            if len(pending) >= workers * 2:
+                found += pending.popleft().result()
+        while pending and len(found) < limit:
+            found += pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+    
+    return found[:limit]
+
+async def _ripgrep_local_snippets(rg: str, workspace_path: str, query_words: List[str],
+                                  search_extensions: List[str], limit: int,
+                                  context: int = 3) -> List[Tuple[str, int, str, int]]:
+    """
+    Search the workspace with one ripgrep process, which walks and matches files in
+    parallel and honours .gitignore. Returns up to limit (file_path, line_number,
+    snippet, hit_count) matches with the same filters and context as _walk_local_snippets,
+    stopping ripgrep once enough are read. Raises OSError if ripgrep cannot be started.
+    """
+    args = [rg, '--json', '--ignore-case', '--fixed-strings', '--context', str(context),
+            '--max-count', str(limit), '--max-filesize', str(MAX_SEARCH_FILE_SIZE)]
+    for ext in search_extensions:
+        args += ['--iglob', f'*{ext}']
+    for suffix in GENERATED_SUFFIXES:
+        args += ['--iglob', f'!*{suffix}']
+    for name in IGNORE_DIRS:
+        args += ['--glob', f'!{name}/']
+    for word in query_words:
+        args += ['-e', word]
+    args += ['--', workspace_path]
+    
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+        limit=MAX_SEARCH_FILE_SIZE * 8  # A JSON event holds a whole (escaped) line
+    )
+    found = []
+    lines = {}  # line_number -> text of the matched and context lines of the current file
+    matches = []  # (line_number, hit_count) of the current file
+    try:
+        # ripgrep writes each file's events as one block: begin, context/match lines, end
+        async for raw in proc.stdout:
+            event = json.loads(raw)
+            kind, data = event['type'], event['data']
+            if kind == 'match' or kind == 'context':
+                text = data['lines'].get('text')  # Absent for lines that are not valid UTF-8
+                if text is not None:
+                    lines[data['line_number']] = text.rstrip('\r\n')
+                    if kind == 'match':
+                        matches.append((data['line_number'], len(data['submatches'])))
+            elif kind == 'end':
+                path = data['path'].get('text')
+                if path is not None:
+                    for line_number, hits in matches[:limit - len(found)]:
+                        snippet = '\n'.join(lines[n] for n in range(line_number - context, line_number + context + 1)
+                                            if n in lines)
+                        found.append((path, line_number, snippet, hits))
+                lines.clear()
+                matches.clear()
+                if len(found) >= limit:
+                    break
+    finally:
+        if proc.returncode is None:
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+        await proc.wait()
+    
+    return found
+
 async def _search_local_files(query: str, workspace_path: str, language_hint: Optional[str] = None) -> Dict[str, Any]:
-    """Search local workspace files for relevant code"""
+    """Search local workspace files for relevant code, with ripgrep when it is on PATH"""
     results = {'snippets': [], 'sources': [], 'explanations': []}
     
     try:
@@ -311,88 +770,67 @@ async def _search_local_files(query: str, workspace_path: str, language_hint: Op
         search_extensions = extensions.get(language_hint, ['.py', '.js', '.ts', '.java', '.cpp', '.go'])
         
         # Search for files containing the query
-        query_words = query.lower().split()
+        query_words = sorted(set(query.split()), key=len, reverse=True)
+        if not query_words:
+            return results
         
-        for file_path in workspace.rglob('*'):
-            if (file_path.is_file() and 
-                file_path.suffix.lower() in search_extensions and
-                not any(part.startswith('.') for part in file_path.parts) and
-                'node_modules' not in str(file_path)):
-                
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        content_lower = content.lower()
-                        
-                        # Check if query words appear in the file
-                        if any(word in content_lower for word in query_words):
-                            # Extract relevant code snippets
-                            lines = content.split('\n')
-                            relevant_lines = []
-                            
-                            for i, line in enumerate(lines):
-                                if any(word in line.lower() for word in query_words):
-                                    # Include context around the match
-                                    start = max(0, i - 3)
-                                    end = min(len(lines), i + 4)
-                                    snippet = '\n'.join(lines[start:end])
-                                    
-                                    results['snippets'].append({
-                                        'language': language_hint or file_path.suffix[1:],
-                                        'code': snippet,
-                                        'source': 'local_file',
-                                        'file_path': str(file_path.relative_to(workspace)),
-                                        'line_number': i + 1,
-                                        'relevance_score': sum(1 for word in query_words if word in line.lower())
-                                    })
-                                    
-                                    if len(results['snippets']) >= 10:
-                                        break
-                                
-                                if len(results['snippets']) >= 10:
-                                    break
-                
-                except Exception:
-                    continue  # Skip files that can't be read
+        found = None
+        rg = shutil.which('rg')
+        if rg:
+            try:
+                found = await _ripgrep_local_snippets(rg, workspace_path, query_words, search_extensions, 10)
+            except OSError:
+                found = None
+        if found is None:
+            found = await asyncio.to_thread(_walk_local_snippets, workspace_path, query_words,
+                                            search_extensions, 10)
+        
+        for file_path, line_number, snippet, hits in found:
+            results['snippets'].append({
+                'language': language_hint or os.path.splitext(file_path)[1][1:],
+                'code': snippet,
+                'source': 'local_file',
+                'file_path': os.path.relpath(file_path, workspace_path),
+                'line_number': line_number,
+                'relevance_score': hits
+            })
         
         # Sort by relevance
-        results['snippets'] = sorted(results['snippets'], 
-                                   key=lambda x: x.get('relevance_score', 0), reverse=True)[:5]
+        results['snippets'] = heapq.nlargest(5, results['snippets'], key=_relevance_key)
     
     except Exception as e:
         results['error'] = f"Local file search failed: {str(e)}"
     
     return results
 
+# Suggestion templates, formatted with the query (q) and language (lang)
+_LANGUAGE_TEMPLATES = ('{q} {lang} best practices', '{q} {lang} examples', 'how to {q} in {lang}')
+_RELATED_TEMPLATES = ('{q} tutorial', '{q} documentation', '{q} error handling', 'debug {q}',
+                      '{q} performance optimization')
+
 def _generate_related_searches(query: str, language_hint: Optional[str], context: Dict[str, Any]) -> List[str]:
     """Generate related search suggestions based on query and context"""
-    suggestions = []
-    
-    # Language-specific suggestions
-    if language_hint:
-        suggestions.extend([
-            f"{query} {language_hint} best practices",
-            f"{query} {language_hint} examples",
-            f"how to {query} in {language_hint}",
-        ])
-    
-    # Framework-specific suggestions based on dependencies
-    frameworks = context.get('dependencies', {})
-    for fw_type, deps in frameworks.items():
-        for dep in deps[:2]:  # Top 2 dependencies
-            suggestions.append(f"{query} {dep}")
-    
-    # Common programming patterns
-    common_patterns = [
-        f"{query} tutorial",
-        f"{query} documentation",
-        f"{query} error handling",
-        f"debug {query}",
-        f"{query} performance optimization"
-    ]
-    suggestions.extend(common_patterns)
+    # Only the top 2 dependencies of each type are used, so just those make up the cache key
+    top_deps = tuple(dep for deps in context.get('dependencies', {}).values() for dep in deps[:2])
+    return list(_cached_related_searches(query, language_hint, top_deps))
+
+@functools.lru_cache(maxsize=256)
+def _cached_related_searches(query: str, language_hint: Optional[str], top_deps: Tuple[str, ...]) -> Tuple[str, ...]:
+    def suggestions() -> Iterator[str]:
+        # Language-specific suggestions
+        if language_hint:
+            for template in _LANGUAGE_TEMPLATES:
+                yield template.format(q=query, lang=language_hint)
+        
+        # Framework-specific suggestions based on dependencies
+        for dep in top_deps:
+            yield f"{query} {dep}"
+        
+        # Common programming patterns
+        for template in _RELATED_TEMPLATES:
+            yield template.format(q=query)
     
-    return suggestions[:8]  # Limit suggestions
+    return tuple(itertools.islice(suggestions(), 8))  # Limit suggestions
 
 @mcp.tool
 async def refine_search(
@@ -428,58 +866,9 @@ async def refine_search(
     refined_query = _analyze_feedback_and_refine_query(original_query, feedback, prev_results)
     
     # Execute refined search
-    # Call the function implementation directly instead of the tool wrapper
-    results = {
-        'query': refined_query,
-        'context': {},
-        'sources': [],
-        'code_snippets': [],
-        'explanations': [],
-        'related_searches': []
-    }
-    
-    # Analyze workspace context
-    if workspace_path:
-        results['context'] = CodeAnalyzer.analyze_workspace_context(workspace_path)
-        if not language_hint and results['context']['languages']:
-            language_hint = results['context']['languages'][0]
-    
-    # Search multiple sources in parallel
-    search_tasks = []
-    
-    # Search Stack Overflow
-    search_tasks.append(_search_stackoverflow(refined_query, language_hint))
-    
-    # Search GitHub if it's a code-related query
-    if any(keyword in refined_query.lower() for keyword in ['code', 'function', 'class', 'method', 'library', 'package']):
-        search_tasks.append(_search_github(refined_query, language_hint))
-    
-    if workspace_path:
-        search_tasks.append(_search_local_files(refined_query, workspace_path, language_hint))
-    
-    # Execute searches in parallel
-    if search_tasks:
-        search_results = await asyncio.gather(*search_tasks, return_exceptions=True)
-        
-        for result in search_results:
-            if isinstance(result, dict) and not isinstance(result, Exception):
-                if 'snippets' in result:
-                    results['code_snippets'].extend(result['snippets'])
-                if 'sources' in result:
-                    results['sources'].extend(result['sources'])
-                if 'explanations' in result:
-                    results['explanations'].extend(result['explanations'])
-    
-    # Generate related search suggestions
-    results['related_searches'] = _generate_related_searches(refined_query, language_hint, results['context'])
-    
-    # Rank and limit results
-    results['code_snippets'] = sorted(results['code_snippets'], 
-                                    key=lambda x: x.get('relevance_score', 0), reverse=True)[:10]
-    results['sources'] = results['sources'][:15]
-    results['explanations'] = results['explanations'][:5]
-    
-    return results
+    # Call the shared implementation directly instead of the tool wrapper
+    return await _do_search(refined_query, workspace_path, language_hint,
+                            include_web=True, include_local=bool(workspace_path))
 
 def _analyze_feedback_and_refine_query(original_query: str, feedback: str, prev_results: Dict) -> str:
     """Analyze user feedback to create a more targeted query"""
@@ -493,7 +882,7 @@ def _analyze_feedback_and_refine_query(original_query: str, feedback: str, prev_
             # Extract common terms from successful snippets
             successful_code = ' '.join([snippet.get('code', '') for snippet in prev_results['code_snippets'][:3]])
             # Add common programming terms found
-            common_terms = re.findall(r'\b[a-zA-Z_][a-zA-Z0-9_]*\b', successful_code)
+            common_terms = _IDENTIFIER_RE.findall(successful_code)
             if common_terms:
                 refined_query = f"{original_query} {' '.join(common_terms[:3])}"
                 return refined_query
@@ -519,6 +908,9 @@ def _analyze_feedback_and_refine_query(original_query: str, feedback: str, prev_
     # Default: combine original query with feedback
     return f"{original_query} {feedback}"
 
+# AST node types that can contain statements; everything else is an expression subtree
+_STATEMENT_NODES = (ast.stmt, ast.excepthandler, ast.match_case)
+
 @mcp.tool
 async def analyze_code_context(file_path: str, line_number: Optional[int] = None) -> Dict[str, Any]:
     """
@@ -535,6 +927,12 @@ async def analyze_code_context(file_path: str, line_number: Optional[int] = None
         Code analysis with functions, classes, imports, and intelligent search suggestions
     """
     
+    # Reading, parsing and regex matching are blocking, so run them in a worker thread
+    return await asyncio.to_thread(_analyze_code_context_sync, file_path, line_number)
+
+def _analyze_code_context_sync(file_path: str, line_number: Optional[int]) -> Dict[str, Any]:
+    """Blocking implementation of analyze_code_context"""
+    
     result = {
         'file_path': file_path,
         'language': '',
@@ -581,9 +979,15 @@ async def analyze_code_context(file_path: str, line_number: Optional[int] = None
         # Python-specific analysis
         if result['language'] == 'python':
             try:
-                tree = ast.parse(content)
+                tree = ast.parse(content, filename=file_path)
                 
-                for node in ast.walk(tree):
+                # Breadth-first like ast.walk, but only through statements: imports and
+                # definitions never sit inside expressions, so those subtrees are skipped
+                nodes = deque(tree.body)
+                while nodes:
+                    node = nodes.popleft()
+                    nodes.extend(child for child in ast.iter_child_nodes(node)
+                                 if isinstance(child, _STATEMENT_NODES))
                     if isinstance(node, ast.Import):
                         for alias in node.names:
                             result['imports'].append(alias.name)
@@ -608,22 +1012,10 @@ async def analyze_code_context(file_path: str, line_number: Optional[int] = None
         
         # General regex-based analysis for all languages
         if not result['functions'] and not result['classes']:
-            # Function patterns for different languages
-            function_patterns = {
-                'python': r'def\s+(\w+)\s*\(',
-                'javascript': r'(?:function\s+(\w+)\s*\(|(\w+)\s*[:=]\s*(?:function\s*\(|async\s*\(|\([^)]*\)\s*=>))',
-                'typescript': r'(?:function\s+(\w+)\s*\(|(\w+)\s*[:=]\s*(?:function\s*\(|async\s*\(|\([^)]*\)\s*=>))',
-                'java': r'(?:public|private|protected)?\s*(?:static)?\s*\w+\s+(\w+)\s*\(',
-                'go': r'func\s+(\w+)\s*\(',
-                'rust': r'fn\s+(\w+)\s*\(',
-                'cpp': r'(?:inline\s+)?(?:virtual\s+)?(?:static\s+)?\w+\s+(\w+)\s*\(',
-                'csharp': r'(?:public|private|protected)?\s*(?:static)?\s*\w+\s+(\w+)\s*\('
-            }
-            
-            pattern = function_patterns.get(result['language'])
+            pattern = _FUNCTION_PATTERNS.get(result['language'])
             if pattern:
                 for i, line in enumerate(lines):
-                    matches = re.finditer(pattern, line)
+                    matches = pattern.finditer(line)
                     for match in matches:
                         func_name = next(g for g in match.groups() if g)
                         if func_name:
@@ -659,7 +1051,7 @@ async def analyze_code_context(file_path: str, line_number: Optional[int] = None
                 ])
             
             # Extract keywords from current line
-            keywords = re.findall(r'\b[a-zA-Z_][a-zA-Z0-9_]*\b', current_line)
+            keywords = _IDENTIFIER_RE.findall(current_line)
             for keyword in keywords[:3]:
                 if len(keyword) > 3:  # Skip short words
                     suggestions.append(f"{keyword} {result['language']} documentation")
@@ -677,7 +1069,52 @@ async def analyze_code_context(file_path: str, line_number: Optional[int] = None
     
     return result
 
+_PREFETCH_DONE = object()  # Queued by _prefetch's producer after the last item
+
+async def _prefetch(source: AsyncIterator[Any], maxsize: int = 8) -> AsyncIterator[Any]:
+    """
+    Iterate source in a background task, buffering up to maxsize items, so the next
+    items keep arriving while the consumer handles the current one. An error raised
+    by source is re-raised to the consumer after the items before it.
+    """
+    queue = asyncio.Queue(maxsize)
+    
+    async def produce() -> None:
+        try:
+            async for item in source:
+                await queue.put((item, None))
+        except Exception as e:
+            await queue.put((_PREFETCH_DONE, e))
+        else:
+            await queue.put((_PREFETCH_DONE, None))
+    
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is _PREFETCH_DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        # Stop the producer if the consumer leaves early or fails
+        producer.cancel()
+        with suppress(asyncio.CancelledError):
+            await producer
+
+# How strongly deep_search favours pages close to the start URL; 0 ranks by score alone
+CRAWL_DEPTH_ALPHA = 0.5
+
+def _crawl_priority(score: float, depth: int) -> float:
+    """Rank a crawled page by its relevance score, discounted by its link depth"""
+    return score / (1 + (depth or 0)) ** CRAWL_DEPTH_ALPHA
+
+# Crawl responses carry page content, so fewer of them are kept
+_crawl_cache = _TTLCache(maxsize=32, ttl=WEB_CACHE_TTL_SECONDS)
+
 @mcp.tool
+@_coalesce_concurrent
 async def deep_search(base_url: str, query: str, max_pages: int = 10, max_depth: int = 2) -> Dict[str, Any]:
     """
     🌐 Advanced web crawling with intelligent content discovery and relevance scoring.
@@ -699,6 +1136,11 @@ async def deep_search(base_url: str, query: str, max_pages: int = 10, max_depth:
         max_pages = min(max_pages, 20)
         max_depth = min(max_depth, 3)
         
+        key = (base_url, query, max_pages, max_depth)
+        cached = _crawl_cache.get(key)
+        if cached is not None:
+            return cached
+        
         # Parse the base URL to get domain
         parsed_url = urlparse(base_url)
         domain = parsed_url.netloc
@@ -738,35 +1180,58 @@ async def deep_search(base_url: str, query: str, max_pages: int = 10, max_depth:
             verbose=False
         )
 
-        # Execute the crawl
-        results = []
+        # Execute the crawl, keeping only the max_pages best pages as results stream in.
+        # top is a min-heap of (priority, -arrival, page): the root is the page to drop
+        # next, and among equal priorities the later arrival goes first, so the final
+        # order matches a stable sort by priority.
+        top = []
+        total_pages = 0
         async with AsyncWebCrawler() as crawler:
-            async for result in await crawler.arun(base_url, config=config):
-                if result.success and result.html:
-                    results.append(result)
-
-        # Sort results by relevance score
-        results.sort(key=lambda x: x.metadata.get("score", 0), reverse=True)
+            # Prefetch so the crawler keeps fetching while each page is scored and trimmed
+            async with aclosing(_prefetch(await crawler.arun(base_url, config=config))) as pages:
+                async for result in pages:
+                    if not (result.success and result.html):
+                        continue
+                    total_pages += 1
+                    metadata = result.metadata
+                    score = metadata.get("score", 0)
+                    depth = metadata.get("depth", 0)
+                    rank = (_crawl_priority(score, depth), -total_pages)
+                    if len(top) >= max_pages and (not top or rank < top[0][:2]):
+                        continue  # Not good enough; its content is never copied
+                
+                    # Only the truncated content is kept, not the whole crawl result. The
+                    # title comes from crawl4ai's own lxml parse of the page: CrawlResult
+                    # has no title field, but the <title> text is in its metadata.
+                    # result.markdown is a property that wraps (copies) the whole markdown
+                    # in a new str subclass on every access, and it is None when markdown
+                    # generation failed, so it is read once and only the preview is kept.
+                    markdown = getattr(result, 'markdown', None)
+                    page_info = {
+                        "url": result.url,
+                        "title": getattr(result, 'title', '') or metadata.get("title") or 'No Title',
+                        "relevance_score": score,
+                        "priority": rank[0],
+                        "depth": depth,
+                        "html_content": result.html[:5000] if result.html else "",  # Limit HTML content
+                        "text_content": markdown[:1000] if markdown else ""  # Preview of text
+                    }
+                    if len(top) < max_pages:
+                        heapq.heappush(top, (*rank, page_info))
+                    else:
+                        heapq.heapreplace(top, (*rank, page_info))
 
-        # Format the response
+        # Format the response, best pages first
         formatted_results = {
             "query": query,
             "base_url": base_url,
-            "total_pages_found": len(results),
-            "pages": []
+            "total_pages_found": total_pages,
+            "pages": [page_info for _, _, page_info in sorted(top, key=lambda entry: entry[:2], reverse=True)]
         }
 
-        for result in results[:max_pages]:
-            page_info = {
-                "url": result.url,
-                "title": getattr(result, 'title', '') or 'No Title',
-                "relevance_score": result.metadata.get("score", 0),
-                "depth": result.metadata.get("depth", 0),
-                "html_content": result.html[:5000] if result.html else "",  # Limit HTML content
-                "text_content": result.markdown[:1000] if hasattr(result, 'markdown') else ""  # Preview of text
-            }
-            formatted_results["pages"].append(page_info)
-
+        # A crawl where no page succeeded (network down, site blocking) is a failure, not a result
+        if total_pages:
+            _crawl_cache.put(key, formatted_results)
         return formatted_results
 
     except Exception as e:
@@ -777,6 +1242,10 @@ async def deep_search(base_url: str, query: str, max_pages: int = 10, max_depth:
             "pages": []
         }
 
+# Related-topic templates for quick_search, formatted with the query (q) and language (lang)
+_TOPIC_TEMPLATES = ('{q} {lang} tutorial', '{q} {lang} best practices', '{q} {lang} examples')
+_TOPIC_TEMPLATES_NO_LANGUAGE = ('{q} tutorial', '{q} examples', 'how to {q}')
+
 @mcp.tool
 async def quick_search(query: str, language: Optional[str] = None) -> Dict[str, Any]:
     """
@@ -821,18 +1290,8 @@ async def quick_search(query: str, language: Optional[str] = None) -> Dict[str,
             ]
         
         # Generate related topics
-        if language:
-            results['related_topics'] = [
-                f"{query} {language} tutorial",
-                f"{query} {language} best practices", 
-                f"{query} {language} examples"
-            ]
-        else:
-            results['related_topics'] = [
-                f"{query} tutorial",
-                f"{query} examples",
-                f"how to {query}"
-            ]
+        templates = _TOPIC_TEMPLATES if language else _TOPIC_TEMPLATES_NO_LANGUAGE
+        results['related_topics'] = [template.format(q=query, lang=language) for template in templates]
             
     except Exception as e:
         results['error'] = f"Quick search failed: {str(e)}"
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Test script for Deep Search MCP server functionality.
+Tests the search helpers directly, without network access.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from server import CodeAnalyzer
+
+def test_extract_code_snippets():
+    """Test code block extraction from answer text."""
+    
+    print("🧪 Testing Deep Search MCP Server")
+    print("=" * 50)
+    
+    # Test 1: Fenced blocks longer than the HTML body cap stay paired
+    print("\n📋 Test 1: Long fenced code blocks")
+    long_block = "x = 1\n" * 5000
+    content = (
+        "```python\n" + long_block + "```\n"
+        "Some prose between the blocks here\n"
+        "```js\n" + long_block + "```\n"
+    )
+    snippets = CodeAnalyzer.extract_code_snippets(content)
+    for snippet in snippets:
+        print(f"  - {snippet['language']}: {snippet['code'][:30]!r}")
+    assert [snippet['language'] for snippet in snippets] == ['python', 'js'], "Should keep both blocks"
+    assert all(snippet['code'].startswith("x = 1") for snippet in snippets), "Should not pair prose as code"
+    
+    # Test 2: HTML code tags
+    print("\n📋 Test 2: HTML code tags")
+    snippets = CodeAnalyzer.extract_code_snippets("<pre><code>print('hello world')</code></pre>")
+    print(f"Snippets found: {len(snippets)}")
+    assert snippets and snippets[0]['code'] == "print('hello world')", "Should extract code tag bodies"
+    
+    print("\n✅ All tests passed!")
+
+if __name__ == "__main__":
+    test_extract_code_snippets()